@@ -3,31 +3,217 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+
+`get_async_db()` returns a Motor (asyncio) handle for `async def` endpoints;
+`get_db()` and the helper functions below are blocking and meant for scripts
+and maintenance jobs.
 """
 
-from pymongo import MongoClient
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, MongoClient, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, PyMongoError
+from motor.motor_asyncio import AsyncIOMotorClient
+from dataclasses import dataclass
 from datetime import datetime, timezone
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from typing import Union
-from pydantic import BaseModel
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, List, Optional, Type, Union
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
 # Load environment variables from .env file
 load_dotenv()
 
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """Connection and pool settings, read from DATABASE_* environment variables"""
+    url: Optional[str] = None
+    name: Optional[str] = None
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+    server_selection_timeout_ms: int = 30000
+
+    @classmethod
+    def from_env(cls) -> "DatabaseSettings":
+        return cls(
+            url=os.getenv("DATABASE_URL"),
+            name=os.getenv("DATABASE_NAME"),
+            max_pool_size=_env_int("DATABASE_MAX_POOL_SIZE", 100),
+            min_pool_size=_env_int("DATABASE_MIN_POOL_SIZE", 0),
+            max_idle_time_ms=_env_int("DATABASE_MAX_IDLE_TIME_MS"),
+            wait_queue_timeout_ms=_env_int("DATABASE_WAIT_QUEUE_TIMEOUT_MS"),
+            server_selection_timeout_ms=_env_int("DATABASE_SERVER_SELECTION_TIMEOUT_MS", 30000),
+        )
+
+    def client_options(self) -> dict:
+        """Keyword arguments for MongoClient / AsyncIOMotorClient"""
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+        }
+        return {k: v for k, v in options.items() if v is not None}
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters collected from CMAP events, summed over all servers and clients"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "wait_queue": self.waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_ms_avg": round(self.wait_time_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_time_max * 1000, 3),
+            }
+
+    def connection_check_out_started(self, event):
+        # check-out runs synchronously on the requesting thread, so start/end pair up per thread
+        self._local.started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event):
+        waited = time.monotonic() - getattr(self._local, "started", time.monotonic())
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+settings = DatabaseSettings.from_env()
+pool_stats = PoolStats()
+
+# Clients are created on first use, once per process: a client inherited
+# across fork() is not safe to use, and creating one can block on DNS/SRV lookups.
+_lock = threading.Lock()
+_pid = None
 _client = None
-db = None
+_async_client = None
+
+
+def _check_pid():
+    global _pid, _client, _async_client
+    if _pid != os.getpid():
+        # forked since the clients were made; drop them rather than share sockets with the parent
+        _client = None
+        _async_client = None
+        if _pid is not None:
+            pool_stats.reset()
+        _pid = os.getpid()
+
+
+def get_db():
+    """Blocking (pymongo) database handle, or None if the database is not configured"""
+    global _client
+    if not (settings.url and settings.name):
+        return None
+    with _lock:
+        _check_pid()
+        if _client is None:
+            _client = MongoClient(settings.url, event_listeners=[pool_stats], **settings.client_options())
+        return _client[settings.name]
+
+
+def get_async_db():
+    """Motor (asyncio) database handle, or None if the database is not configured"""
+    global _async_client
+    if not (settings.url and settings.name):
+        return None
+    with _lock:
+        _check_pid()
+        if _async_client is None:
+            _async_client = AsyncIOMotorClient(settings.url, event_listeners=[pool_stats], **settings.client_options())
+        return _async_client[settings.name]
+
+
+def close_clients():
+    """Close this process's clients; the next accessor call reconnects"""
+    global _client, _async_client
+    with _lock:
+        for client in (_client, _async_client):
+            if client is not None:
+                client.close()
+        _client = None
+        _async_client = None
 
-database_url = os.getenv("DATABASE_URL")
-database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+def __getattr__(name):
+    # `db` / `async_db` remain importable as module attributes, resolved on access
+    if name == "db":
+        return get_db()
+    if name == "async_db":
+        return get_async_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Helper functions for common database operations
 def create_document(collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
+    db = get_db()
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
@@ -37,19 +223,298 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    now = datetime.now(timezone.utc)
+    data_dict['created_at'] = now
+    data_dict['updated_at'] = now
 
     result = db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+def _validate_batch(batch: list, model: Type[BaseModel]):
+    """Validate a batch against `model` in one pass; returns (dicts by index, errors by index)"""
+    valid, errors = {}, {}
+    try:
+        items = _list_adapter(model).validate_python(batch)
+        return {i: item.model_dump() for i, item in enumerate(items)}, errors
+    except ValidationError as e:
+        for err in e.errors():
+            errors.setdefault(err["loc"][0], err["msg"])
+    # only the failing path revalidates item by item, to keep the good ones
+    for i, item in enumerate(batch):
+        if i not in errors:
+            valid[i] = model.model_validate(item).model_dump()
+    return valid, errors
+
+def create_documents(collection_name: str, documents: Iterable[Union[BaseModel, dict]], batch_size: int = 1000,
+                     model: Type[BaseModel] = None):
+    """Insert many documents with timestamps, using unordered insert_many per batch
+
+    Dicts are validated against `model` when one is given. Returns
+    {"inserted_ids": [...], "errors": [{"index": ..., "error": ...}]}, where
+    index is the position in `documents`.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    inserted_ids, errors = [], []
+    documents = iter(documents)
+    offset = 0
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            break
+
+        # BaseModel instances are already validated; dicts go through `model` together
+        raw = {i: d for i, d in enumerate(batch) if not isinstance(d, BaseModel)}
+        prepared = {i: d.model_dump() for i, d in enumerate(batch) if isinstance(d, BaseModel)}
+        if model is not None and raw:
+            valid, invalid = _validate_batch(list(raw.values()), model)
+            keys = list(raw)
+            prepared.update({keys[j]: d for j, d in valid.items()})
+            errors.extend({"index": offset + keys[j], "error": msg} for j, msg in invalid.items())
+        else:
+            prepared.update({i: d.copy() for i, d in raw.items()})
+
+        now = datetime.now(timezone.utc)
+        positions = sorted(prepared)
+        docs = [prepared[i] for i in positions]
+        for doc in docs:
+            doc['created_at'] = now
+            doc['updated_at'] = now
+
+        failed = set()
+        if docs:
+            try:
+                db[collection_name].insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                for err in e.details.get("writeErrors", []):
+                    failed.add(err["index"])
+                    errors.append({"index": offset + positions[err["index"]], "error": err["errmsg"]})
+        # insert_many assigns _id client-side, so every doc not reported as failed was stored
+        inserted_ids.extend(str(doc["_id"]) for j, doc in enumerate(docs) if j not in failed)
+        offset += len(batch)
+
+    errors.sort(key=lambda e: e["index"])
+    return {"inserted_ids": inserted_ids, "errors": errors}
+
+def get_document(collection_name: str, filter_dict: dict = None, projection: dict = None):
+    """Get a single document (or None) with find_one"""
+    db = get_db()
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+
+    return db[collection_name].find_one(filter_dict or {}, projection)
+
+def iter_documents(collection_name: str, filter_dict: dict = None, projection: dict = None, sort=None,
+                   batch_size: int = None):
+    """Yield documents lazily, fetching `batch_size` per round trip"""
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    # closes the server-side cursor if the caller stops early
+    with cursor:
+        yield from cursor
+
+def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None,
+                  sort=None, skip: int = None, after=None):
+    """Get documents from collection
+
+    `after` resumes past the given _id, which unlike `skip` costs the same
+    however deep the page is. Results are then ordered by _id, so it cannot
+    be combined with `sort`.
+    """
+    if after is not None and sort:
+        raise ValueError("get_documents: `after` pages by _id and cannot be combined with `sort`")
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    filter_dict = dict(filter_dict or {})
+    if after is not None:
+        if "_id" in filter_dict:
+            filter_dict = {"$and": [filter_dict, {"_id": {"$gt": after}}]}
+        else:
+            filter_dict["_id"] = {"$gt": after}
+        sort = [("_id", 1)]
+    cursor = db[collection_name].find(filter_dict, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if skip:
+        cursor = cursor.skip(skip)
     if limit:
         cursor = cursor.limit(limit)
-    
+
     return list(cursor)
+
+def _update_spec(update_data: Union[BaseModel, dict], now: datetime) -> dict:
+    """Turn field changes (or an operator document) into an update that stamps updated_at"""
+    if isinstance(update_data, BaseModel):
+        update_data = update_data.model_dump(exclude_unset=True)
+    if any(k.startswith("$") for k in update_data):
+        spec = {op: dict(fields) for op, fields in update_data.items()}
+    else:
+        spec = {"$set": dict(update_data)}
+    spec.setdefault("$set", {})["updated_at"] = now
+    return spec
+
+def update_document(collection_name: str, filter_dict: dict, update_data: Union[BaseModel, dict], upsert: bool = False):
+    """Update a single document with timestamp; returns matched/modified counts"""
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = db[collection_name].update_one(filter_dict, _update_spec(update_data, datetime.now(timezone.utc)), upsert=upsert)
+    return {"matched": result.matched_count, "modified": result.modified_count}
+
+def delete_document(collection_name: str, filter_dict: dict):
+    """Delete a single document; returns the number deleted (0 or 1)"""
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return db[collection_name].delete_one(filter_dict).deleted_count
+
+def _bulk_write(collection, requests: list, ordered: bool, offset: int):
+    """Run one bulk_write; returns (raw result counts, errors with input positions)"""
+    try:
+        return collection.bulk_write(requests, ordered=ordered).bulk_api_result, []
+    except BulkWriteError as e:
+        errors = [{"index": offset + err["index"], "error": err["errmsg"]} for err in e.details.get("writeErrors", [])]
+        return e.details, errors
+
+def bulk_update_documents(collection_name: str, updates: Iterable[tuple], ordered: bool = True,
+                          batch_size: int = 1000, upsert: bool = False):
+    """Apply many (filter, update_data) pairs with one bulk_write per batch
+
+    Ordered mode stops at the first failing update; unordered mode applies
+    everything it can. Returns matched/modified/upserted counts and errors
+    keyed by position in `updates`.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    totals = {"matched": 0, "modified": 0, "upserted": 0, "errors": []}
+    updates = iter(updates)
+    offset = 0
+    while True:
+        batch = list(islice(updates, batch_size))
+        if not batch:
+            break
+        now = datetime.now(timezone.utc)
+        requests = [UpdateOne(f, _update_spec(u, now), upsert=upsert) for f, u in batch]
+        result, errors = _bulk_write(db[collection_name], requests, ordered, offset)
+        totals["matched"] += result.get("nMatched", 0)
+        totals["modified"] += result.get("nModified", 0)
+        totals["upserted"] += result.get("nUpserted", 0)
+        totals["errors"].extend(errors)
+        if errors and ordered:
+            break
+        offset += len(batch)
+    return totals
+
+def bulk_delete_documents(collection_name: str, filters: Iterable[dict], ordered: bool = True, batch_size: int = 1000,
+                          many: bool = False):
+    """Delete one document per filter, like delete_document, with one bulk_write per batch
+
+    With many=True each filter deletes every document it matches instead.
+    Returns the deleted count and errors keyed by position in `filters`;
+    ordered mode stops at the first failing delete.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    totals = {"deleted": 0, "errors": []}
+    filters = iter(filters)
+    offset = 0
+    while True:
+        batch = list(islice(filters, batch_size))
+        if not batch:
+            break
+        op = DeleteMany if many else DeleteOne
+        result, errors = _bulk_write(db[collection_name], [op(f) for f in batch], ordered, offset)
+        totals["deleted"] += result.get("nRemoved", 0)
+        totals["errors"].extend(errors)
+        if errors and ordered:
+            break
+        offset += len(batch)
+    return totals
+
+def pair_key(a: ObjectId, b: ObjectId) -> str:
+    """Order-independent key for a pair of users: mutual_match and conversation _id"""
+    lo, hi = sorted([a, b])
+    return f"{lo}_{hi}"
+
+
+def collection_name(model: Type[BaseModel]) -> str:
+    """Collection a schema maps to: its `collection` override, else the lowercased class name"""
+    return getattr(model, "collection", None) or model.__name__.lower()
+
+
+def _index_models(schemas_module=None) -> dict:
+    """Declared IndexModels per collection, gathered from schemas.py"""
+    if schemas_module is None:
+        import schemas as schemas_module
+    declared = {}
+    for obj in vars(schemas_module).values():
+        if isinstance(obj, type) and issubclass(obj, BaseModel) and getattr(obj, "indexes", None):
+            declared.setdefault(collection_name(obj), []).extend(obj.indexes)
+    return declared
+
+def ensure_indexes(create: bool = True, schemas_module=None) -> dict:
+    """Create declared indexes that are missing (idempotent) and report drift
+
+    Returns, per collection: created, missing (declared but absent), extra
+    (present but undeclared), conflicting (same name, different keys or
+    uniqueness), in_progress (index builds currently running) and error.
+    """
+    db = get_db()
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    try:
+        building = list(db.client.admin.aggregate([
+            {"$currentOp": {"allUsers": True}},
+            {"$match": {"command.createIndexes": {"$exists": True}, "ns": {"$regex": f"^{db.name}\\."}}},
+        ]))
+    except PyMongoError:
+        # $currentOp needs the inprog privilege; report without it
+        building = []
+
+    report = {}
+    for coll, models in _index_models(schemas_module).items():
+        entry = {"created": [], "missing": [], "extra": [], "conflicting": [], "in_progress": [], "error": None}
+        try:
+            existing = db[coll].index_information()
+            declared = {m.document["name"]: m for m in models}
+            for name, model in declared.items():
+                info = existing.get(name)
+                if info is None:
+                    entry["missing"].append(name)
+                elif (list(model.document["key"].items()) != list(info["key"])
+                      or model.document.get("unique", False) != info.get("unique", False)):
+                    entry["conflicting"].append(name)
+            entry["extra"] = [name for name in existing if name != "_id_" and name not in declared]
+            entry["in_progress"] = [
+                ix["name"] for op in building if op["command"].get("createIndexes") == coll
+                for ix in op["command"].get("indexes", [])
+            ]
+            to_create = [declared[n] for n in entry["missing"] if n not in entry["in_progress"]]
+            if create and to_create:
+                entry["created"] = db[coll].create_indexes(to_create)
+        except PyMongoError as e:
+            entry["error"] = str(e)
+        report[coll] = entry
+    return report
@@ -0,0 +1,219 @@
+"""
+Discovery Queue
+
+Per-user queue of candidate profiles for GET /profiles/next.
+
+Building the candidate list means scanning the user's swipe history and
+walking the profile collection, so it is done once per refill instead of
+once per request. The endpoint only peeks at the head of the queue, and
+likes/dislikes drop their target from it. The queue is per worker, so
+/profiles/next confirms the head against `match` before serving it.
+"""
+
+import os
+import time
+from collections import OrderedDict, deque
+
+from database import get_async_db
+from dislike_buffer import dislike_buffer
+from swipe_filter import SwipeFilter, load_swipe_filter
+
+DISCOVERY_QUEUE_SIZE = int(os.getenv("DISCOVERY_QUEUE_SIZE", 200))
+DISCOVERY_REFILL_THRESHOLD = int(os.getenv("DISCOVERY_REFILL_THRESHOLD", 20))
+DISCOVERY_QUEUE_TTL = int(os.getenv("DISCOVERY_QUEUE_TTL", 300))
+DISCOVERY_MAX_USERS = int(os.getenv("DISCOVERY_MAX_USERS", 10000))
+
+# Fields returned for discovery candidates
+PROFILE_PROJECTION = {
+    "user_id": 1, "nickname": 1, "bio": 1, "tags": 1, "photos": 1, "age": 1,
+    "created_at": 1, "updated_at": 1,
+}
+
+_SORT = [("updated_at", -1), ("_id", -1)]
+_KEY_FIELDS = {"_id", "user_id", "updated_at"}
+
+
+def _candidate_query(user_oid, after: tuple = None) -> dict:
+    query = {"user_id": {"$ne": user_oid}}
+    pending = dislike_buffer.pending(user_oid)
+    if pending:
+        # dislikes not yet written to `match`
+        query["user_id"]["$nin"] = list(pending)
+    if after:
+        updated_at, last_id = after
+        query["$or"] = [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$lt": last_id}},
+        ]
+    return query
+
+
+async def _screened_candidates(user_oid, sf: SwipeFilter, limit: int, projection: dict, after: tuple):
+    """Page through profile keys, confirming only swipe-filter hits against `match`"""
+    page_size = max(limit * 2, 50)
+    selected = []
+    while len(selected) < limit:
+        keys = await (
+            get_async_db()["profile"].find(_candidate_query(user_oid, after), {"user_id": 1, "updated_at": 1})
+            .sort(_SORT).limit(page_size).to_list(None)
+        )
+        maybe = [c["user_id"] for c in keys if c["user_id"] in sf]
+        acted = set()
+        if maybe:
+            acted = set(await get_async_db()["match"].distinct("target_id", {"user_id": user_oid, "target_id": {"$in": maybe}}))
+        selected.extend(c for c in keys if c["user_id"] not in acted)
+        if len(keys) < page_size:
+            break
+        after = (keys[-1]["updated_at"], keys[-1]["_id"])
+    selected = selected[:limit]
+
+    if not selected or (projection and set(projection) <= _KEY_FIELDS):
+        return selected
+    cursor = get_async_db()["profile"].find({"_id": {"$in": [c["_id"] for c in selected]}}, projection)
+    docs = {d["_id"]: d async for d in cursor}
+    return [docs[c["_id"]] for c in selected if c["_id"] in docs]
+
+
+async def _anti_join_candidates(user_oid, limit: int, projection: dict, after: tuple):
+    """Exclude swiped profiles with a `$lookup` anti-join against `match`"""
+    pipeline = [
+        {"$match": _candidate_query(user_oid, after)},
+        {"$sort": dict(_SORT)},
+        {"$lookup": {
+            "from": "match",
+            "localField": "user_id",
+            "foreignField": "target_id",
+            "pipeline": [{"$match": {"user_id": user_oid}}, {"$limit": 1}, {"$project": {"_id": 1}}],
+            "as": "_acted",
+        }},
+        {"$match": {"_acted": {"$size": 0}}},
+        {"$limit": limit},
+        {"$project": projection or {"_acted": 0}},
+    ]
+    return await get_async_db()["profile"].aggregate(pipeline).to_list(None)
+
+
+async def find_candidates(user_oid, limit: int, projection: dict = None, after: tuple = None):
+    """Return up to `limit` profiles the user has not acted upon, newest first.
+
+    Profiles missing from the user's swipe filter are unseen for certain, so
+    only filter hits are checked against `match`. Once the filter is past
+    capacity its hit rate climbs, and exclusion falls back to a `$lookup`
+    anti-join inside MongoDB.
+    `after` is an (updated_at, _id) pair; only profiles sorting after it are returned.
+    """
+    sf = await load_swipe_filter(user_oid)
+    if sf.saturated:
+        return await _anti_join_candidates(user_oid, limit, projection, after)
+    return await _screened_candidates(user_oid, sf, limit, projection, after)
+
+
+async def build_candidates(user_oid, limit: int):
+    """Return up to `limit` profile user_ids the user has not acted upon, newest first"""
+    return [c["user_id"] for c in await find_candidates(user_oid, limit, {"user_id": 1})]
+
+
+class _UserQueue:
+    def __init__(self):
+        self.ids = deque()
+        self.members = set()
+        self.built_at = 0.0
+        self.exhausted = False
+        self.refilling = False
+        # targets acted upon while a refill is in flight
+        self.acted_during_refill = set()
+
+
+class DiscoveryQueue:
+    """In-process cache of candidate queues, one per user.
+
+    Only touched from the event loop, and no method awaits while it
+    mutates a queue, so no locking is needed.
+    """
+
+    def __init__(self, size: int = DISCOVERY_QUEUE_SIZE, refill_threshold: int = DISCOVERY_REFILL_THRESHOLD,
+                 ttl: int = DISCOVERY_QUEUE_TTL, max_users: int = DISCOVERY_MAX_USERS):
+        self.size = size
+        self.refill_threshold = refill_threshold
+        self.ttl = ttl
+        self.max_users = max_users
+        self._queues = OrderedDict()
+
+    def _get(self, user_oid):
+        q = self._queues.get(user_oid)
+        if q is not None:
+            self._queues.move_to_end(user_oid)
+        return q
+
+    @staticmethod
+    def _head(q):
+        while q.ids and q.ids[0] not in q.members:
+            q.ids.popleft()
+        return q.ids[0] if q.ids else None
+
+    async def peek(self, user_oid):
+        """Return the next candidate user_id, building the queue on first use.
+
+        A queue that has run dry is rebuilt once before giving up, so
+        profiles created since it was built are still found.
+        """
+        q = self._get(user_oid)
+        if q is None or (self._head(q) is None and not q.refilling):
+            if q is not None:
+                q.refilling = True
+                q.acted_during_refill = set()
+            await self.refill(user_oid)
+        q = self._get(user_oid)
+        if q is None:
+            return None
+        return self._head(q)
+
+    def claim_refill(self, user_oid) -> bool:
+        """Mark the queue as refilling if it is running low or stale; True if the caller should refill"""
+        q = self._get(user_oid)
+        if q is None or q.refilling:
+            return False
+        stale = time.monotonic() - q.built_at > self.ttl
+        low = len(q.members) < self.refill_threshold and not q.exhausted
+        if not (stale or low):
+            return False
+        q.refilling = True
+        q.acted_during_refill = set()
+        return True
+
+    async def refill(self, user_oid):
+        """Rebuild the user's queue from the database"""
+        try:
+            candidates = await build_candidates(user_oid, self.size)
+        except Exception:
+            q = self._get(user_oid)
+            if q is not None:
+                q.refilling = False
+            raise
+        q = self._get(user_oid)
+        if q is None:
+            q = _UserQueue()
+            self._queues[user_oid] = q
+            while len(self._queues) > self.max_users:
+                self._queues.popitem(last=False)
+        candidates = [c for c in candidates if c not in q.acted_during_refill]
+        q.ids = deque(candidates)
+        q.members = set(candidates)
+        q.built_at = time.monotonic()
+        q.exhausted = len(candidates) < self.size
+        q.refilling = False
+        q.acted_during_refill = set()
+
+    def invalidate(self, user_oid, target_oid):
+        """Drop a target the user has just liked or disliked"""
+        q = self._queues.get(user_oid)
+        if q is None:
+            return
+        q.members.discard(target_oid)
+        if q.ids and q.ids[0] == target_oid:
+            q.ids.popleft()
+        if q.refilling:
+            q.acted_during_refill.add(target_oid)
+
+
+discovery_queue = DiscoveryQueue()
@@ -0,0 +1,133 @@
+"""
+Dislike Buffer
+
+Optional write-behind queue for dislikes (DISLIKE_BUFFER=1).
+
+Dislikes are most of the swipe traffic and nothing reads them until the
+next discovery refill, so /profiles/like can hand them to this buffer
+instead of writing each one. Pending dislikes are coalesced per
+(user, target) and written with one bulk write when DISLIKE_BUFFER_SIZE
+pairs are pending or every DISLIKE_BUFFER_INTERVAL seconds, and once more
+on shutdown. Dislikes still pending when a worker dies without a graceful
+shutdown are lost.
+
+The buffer is per worker. Discovery excludes the user's pending targets;
+a like for a pending pair drops the dislike, or waits for it to be
+written if a flush already has it, so the like always lands last.
+"""
+
+import asyncio
+import logging
+import os
+
+DISLIKE_BUFFER = os.getenv("DISLIKE_BUFFER", "0") == "1"
+DISLIKE_BUFFER_SIZE = int(os.getenv("DISLIKE_BUFFER_SIZE", 1000))
+DISLIKE_BUFFER_INTERVAL = float(os.getenv("DISLIKE_BUFFER_INTERVAL", 1.0))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class DislikeBuffer:
+    """Pending dislikes, one target set per user.
+
+    Only touched from the event loop.
+    """
+
+    def __init__(self, size: int = DISLIKE_BUFFER_SIZE, interval: float = DISLIKE_BUFFER_INTERVAL):
+        self.size = size
+        self.interval = interval
+        self._pending = {}
+        self._count = 0
+        # batch being written, and pairs liked while it was in flight
+        self._inflight = {}
+        self._superseded = set()
+        self._flushed = None
+        self._lock = None
+        self._wake = None
+        self._task = None
+        self._write = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self, write):
+        """Start the flush task; `write` is awaited with a list of (user_oid, target_oid) pairs"""
+        self._write = write
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write whatever is still pending"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    def add(self, user_oid, target_oid):
+        targets = self._pending.setdefault(user_oid, set())
+        if target_oid not in targets:
+            targets.add(target_oid)
+            self._count += 1
+        if self._count >= self.size:
+            self._wake.set()
+
+    def pending(self, user_oid) -> set:
+        """Targets the user has disliked that are not yet in `match`"""
+        return self._pending.get(user_oid, set()) | self._inflight.get(user_oid, set())
+
+    async def discard(self, user_oid, target_oid):
+        """Drop a pending dislike that a synchronous swipe is about to overwrite"""
+        targets = self._pending.get(user_oid)
+        if targets and target_oid in targets:
+            targets.discard(target_oid)
+            self._count -= 1
+            if not targets:
+                del self._pending[user_oid]
+        if target_oid in self._inflight.get(user_oid, ()):
+            self._superseded.add((user_oid, target_oid))
+            await asyncio.shield(self._flushed)
+
+    async def flush(self):
+        """Write all pending dislikes with one bulk write"""
+        if self._lock is None:
+            return
+        async with self._lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending, self._count = self._pending, {}, 0
+            self._flushed = asyncio.get_running_loop().create_future()
+            pairs = [(u, t) for u, targets in self._inflight.items() for t in targets]
+            try:
+                await self._write(pairs)
+            except Exception:
+                # requeue, except pairs a like has overwritten since
+                for u, t in pairs:
+                    if (u, t) not in self._superseded:
+                        self.add(u, t)
+                raise
+            finally:
+                self._flushed.set_result(None)
+                self._inflight = {}
+                self._superseded = set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning("dislike flush failed: %s", e)
+
+
+dislike_buffer = DislikeBuffer()
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings for production (`./start_server.sh prod`).
+
+Each worker is a uvicorn event loop (uvloop + httptools, both pinned in
+requirements.txt and picked up by the worker automatically) and imports
+the app after fork, so every worker opens its own database pool.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# Recycle workers after N requests (jittered so they don't all restart at once)
+max_requests = int(os.getenv("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 1000))
+
+# On SIGTERM, workers stop accepting connections and get this long to drain
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
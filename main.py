@@ -1,14 +1,80 @@
 import os
+import asyncio
+import base64
+import json
+import logging
+from contextlib import asynccontextmanager, suppress
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from bson import ObjectId
-from datetime import datetime
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta, timezone
 
-from database import db, create_document, get_documents
-
-app = FastAPI(title="ROOMANCE API")
+from database import (
+    close_clients, create_document, ensure_indexes, get_async_db, get_documents, pair_key, pool_stats, settings,
+)
+from realtime import OVERFLOW, broker, inbox
+from discovery import PROFILE_PROJECTION, discovery_queue, find_candidates
+from swipe_filter import record_swipes
+from dislike_buffer import DISLIKE_BUFFER, dislike_buffer
+from match_events import consumer as match_event_consumer, write_mutual_matches
+
+# Max items per stream in one /chats/sync response
+SYNC_LIMIT = int(os.getenv("SYNC_LIMIT", 200))
+# Watermarks trail the clock so writes still in flight are picked up next time
+SYNC_LAG_SECONDS = float(os.getenv("SYNC_LAG_SECONDS", 2))
+# Create the indexes declared in schemas.py when a worker starts
+ENSURE_INDEXES_ON_STARTUP = os.getenv("ENSURE_INDEXES_ON_STARTUP", "1") == "1"
+# Max swipes accepted by one /profiles/like_batch request
+LIKE_BATCH_MAX = int(os.getenv("LIKE_BATCH_MAX", 500))
+# Seconds between keep-alive comments on idle /events/stream connections
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+
+logger = logging.getLogger("uvicorn.error")
+
+async def _wait_for_database(app: FastAPI):
+    """Mark the worker ready once its connection pool answers a ping"""
+    # create this worker's client after fork, off the event loop so SRV/DNS lookups don't hold up startup
+    async_db = await asyncio.get_running_loop().run_in_executor(None, get_async_db)
+    if async_db is None:
+        return
+    # the consumer's queries would otherwise create the client on the event loop
+    match_event_consumer.start()
+    while True:
+        try:
+            await async_db.command("ping")
+            app.state.db_ready = True
+            break
+        except Exception:
+            await asyncio.sleep(1)
+    if ENSURE_INDEXES_ON_STARTUP:
+        try:
+            report = await asyncio.get_running_loop().run_in_executor(None, ensure_indexes)
+        except Exception as e:
+            logger.warning("ensure_indexes failed: %s", e)
+            return
+        for collection, entry in report.items():
+            drift = {k: v for k, v in entry.items() if v}
+            if drift:
+                logger.info("indexes on %s: %s", collection, drift)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db_ready = False
+    readiness = asyncio.create_task(_wait_for_database(app))
+    if DISLIKE_BUFFER:
+        dislike_buffer.start(write_dislikes)
+    yield
+    readiness.cancel()
+    await match_event_consumer.stop()
+    await dislike_buffer.stop()
+    close_clients()
+
+app = FastAPI(title="ROOMANCE API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,12 +100,29 @@ def serialize(doc: dict):
     _id = d.pop("_id", None)
     if _id:
         d["id"] = str(_id)
-    # Convert datetime to isoformat
+    # Convert datetime to isoformat and ObjectId references to str
     for k, v in list(d.items()):
         if isinstance(v, datetime):
             d[k] = v.isoformat()
+        elif isinstance(v, ObjectId):
+            d[k] = str(v)
     return d
 
+
+def encode_cursor(ts: datetime, key) -> str:
+    """Opaque pagination token for a (timestamp, _id) sort key"""
+    raw = f"{ts.isoformat()}|{key}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, key_type=ObjectId):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        ts, key = raw.split("|")
+        return datetime.fromisoformat(ts), key_type(key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 # ---------- Schemas ----------
 
 class SignupRequest(BaseModel):
@@ -75,6 +158,14 @@ class LikeRequest(BaseModel):
     target_id: str
     action: str = Field(..., pattern="^(like|dislike)$")
 
+class SwipeItem(BaseModel):
+    target_id: str
+    action: str = Field(..., pattern="^(like|dislike)$")
+
+class LikeBatchRequest(BaseModel):
+    user_id: str
+    swipes: List[SwipeItem] = Field(..., min_length=1, max_length=LIKE_BATCH_MAX)
+
 class SendMessageRequest(BaseModel):
     user_id: str
     peer_id: str
@@ -83,11 +174,11 @@ class SendMessageRequest(BaseModel):
 # ---------- Basic ----------
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "ROOMANCE backend is live"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -97,13 +188,14 @@ def test_database():
         "collections": []
     }
     try:
-        if db is not None:
+        async_db = get_async_db()
+        if async_db is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = db.name
+            response["database_name"] = async_db.name
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await async_db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -114,32 +206,60 @@ def test_database():
         response["database"] = f"❌ Error: {str(e)[:80]}"
     return response
 
+@app.get("/health/ready")
+async def readiness():
+    """Readiness gate for load balancers and the production launcher"""
+    if not app.state.db_ready:
+        raise HTTPException(status_code=503, detail="Database not ready")
+    return {"status": "ready"}
+
+@app.get("/metrics/db_pool")
+async def db_pool_metrics():
+    """Connection pool usage, for sizing DATABASE_MAX_POOL_SIZE against worker counts"""
+    return {
+        "max_pool_size": settings.max_pool_size,
+        "min_pool_size": settings.min_pool_size,
+        **pool_stats.snapshot(),
+    }
+
+@app.get("/metrics/match_events")
+async def match_event_metrics():
+    """Match event outbox backlog and delivery counters for this worker"""
+    return await match_event_consumer.lag()
+
 # ---------- Auth ----------
 
 @app.post("/auth/signup", response_model=AuthResponse)
-def signup(payload: SignupRequest):
+async def signup(payload: SignupRequest):
     # check existing
-    existing = db["user"].find_one({"email": payload.email}) if db else None
+    existing = await get_async_db()["user"].find_one({"email": payload.email}) if get_async_db() is not None else None
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     user_doc = {
         "email": payload.email,
         "password": payload.password,  # demo only; not for production
     }
-    user_id = db["user"].insert_one(user_doc).inserted_id
+    user_id = (await get_async_db()["user"].insert_one(user_doc)).inserted_id
     return {"user_id": str(user_id), "email": payload.email}
 
 @app.post("/auth/login", response_model=AuthResponse)
-def login(payload: LoginRequest):
-    user = db["user"].find_one({"email": payload.email, "password": payload.password}) if db else None
+async def login(payload: LoginRequest):
+    user = await get_async_db()["user"].find_one({"email": payload.email, "password": payload.password}) if get_async_db() is not None else None
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     return {"user_id": str(user["_id"]), "email": user["email"]}
 
 # ---------- Profile ----------
 
+async def publish_profile(user_oid, profile: dict):
+    """Push a changed profile to the inboxes of the user's matches"""
+    async for m in get_async_db()["mutual_match"].find({"user_ids": user_oid}, {"user_ids": 1}):
+        for peer_oid in m["user_ids"]:
+            if peer_oid != user_oid:
+                inbox.publish(str(peer_oid), "profile", profile)
+
 @app.post("/profile/details")
-def create_or_complete_profile(details: ProfileDetails):
+async def create_or_complete_profile(details: ProfileDetails, background_tasks: BackgroundTasks):
     user_oid = to_oid(details.user_id)
     # upsert
     update = {
@@ -154,108 +274,480 @@ def create_or_complete_profile(details: ProfileDetails):
         },
         "$setOnInsert": {"created_at": datetime.utcnow()},
     }
-    db["profile"].update_one({"user_id": user_oid}, update, upsert=True)
-    prof = db["profile"].find_one({"user_id": user_oid})
-    return serialize(prof)
+    prof = await get_async_db()["profile"].find_one_and_update(
+        {"user_id": user_oid}, update, upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    saved = serialize(prof)
+    background_tasks.add_task(publish_profile, user_oid, saved)
+    return saved
 
 @app.get("/profile/me")
-def get_my_profile(user_id: str):
+async def get_my_profile(user_id: str):
     user_oid = to_oid(user_id)
-    prof = db["profile"].find_one({"user_id": user_oid})
+    prof = await get_async_db()["profile"].find_one({"user_id": user_oid})
     if not prof:
         raise HTTPException(status_code=404, detail="Profile not found")
     return serialize(prof)
 
 @app.post("/profile/update")
-def update_profile(payload: ProfileUpdate):
+async def update_profile(payload: ProfileUpdate, background_tasks: BackgroundTasks):
     user_oid = to_oid(payload.user_id)
     changes = {k: v for k, v in payload.model_dump().items() if k not in ("user_id",) and v is not None}
     if not changes:
         raise HTTPException(status_code=400, detail="No changes provided")
     changes["updated_at"] = datetime.utcnow()
-    res = db["profile"].update_one({"user_id": user_oid}, {"$set": changes})
-    if res.matched_count == 0:
+    prof = await get_async_db()["profile"].find_one_and_update(
+        {"user_id": user_oid}, {"$set": changes}, return_document=ReturnDocument.AFTER,
+    )
+    if prof is None:
         raise HTTPException(status_code=404, detail="Profile not found")
-    prof = db["profile"].find_one({"user_id": user_oid})
-    return serialize(prof)
+    saved = serialize(prof)
+    background_tasks.add_task(publish_profile, user_oid, saved)
+    return saved
 
 # ---------- Discovery / Likes ----------
 
 @app.get("/profiles/next")
-def next_profile(user_id: str):
+async def next_profile(user_id: str, background_tasks: BackgroundTasks):
     user_oid = to_oid(user_id)
-    # exclude self and already acted upon
-    acted_ids = set()
-    for m in db["match"].find({"user_id": user_oid}):
-        acted_ids.add(m.get("target_id"))
-    query = {
-        "user_id": {"$ne": user_oid}
-    }
-    candidates = db["profile"].find(query).sort("updated_at", -1)
-    for cand in candidates:
-        if cand["user_id"] not in acted_ids:
-            return serialize(cand)
-    return {"message": "No more profiles"}
+    # candidates come from the user's precomputed queue (self and already acted upon are excluded)
+    while True:
+        cand_id = await discovery_queue.peek(user_oid)
+        if cand_id is None:
+            return {"message": "No more profiles"}
+        # the swipe may have gone through another worker, which cannot invalidate this queue
+        acted = await get_async_db()["match"].find_one({"user_id": user_oid, "target_id": cand_id}, {"_id": 1})
+        cand = None if acted else await get_async_db()["profile"].find_one({"user_id": cand_id})
+        if cand:
+            break
+        # swiped elsewhere, or the profile was removed since the queue was built
+        discovery_queue.invalidate(user_oid, cand_id)
+    if discovery_queue.claim_refill(user_oid):
+        background_tasks.add_task(discovery_queue.refill, user_oid)
+    return serialize(cand)
+
+@app.get("/profiles/next_batch")
+async def next_profile_batch(user_id: str, k: int = Query(10, ge=1, le=50), cursor: Optional[str] = None):
+    user_oid = to_oid(user_id)
+    after = decode_cursor(cursor) if cursor else None
+    profiles = await find_candidates(user_oid, k, PROFILE_PROJECTION, after=after)
+    next_cursor = None
+    if len(profiles) == k:
+        next_cursor = encode_cursor(profiles[-1]["updated_at"], profiles[-1]["_id"])
+    return {"profiles": [serialize(p) for p in profiles], "next_cursor": next_cursor}
+
+async def _write_swipes(swipes: list) -> set:
+    """Upsert (user_oid, target_oid, action) swipes in order; return the indexes that inserted a new document"""
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"user_id": user_oid, "target_id": target_oid},
+            {"$set": {"action": action, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+        for user_oid, target_oid, action in swipes
+    ]
+    inserted = set()
+    start = 0
+    for attempt in range(3):
+        try:
+            res = await get_async_db()["match"].bulk_write(ops[start:], ordered=True)
+            inserted.update(start + i for i in res.upserted_ids)
+            return inserted
+        except BulkWriteError as e:
+            inserted.update(start + u["index"] for u in e.details.get("upserted", []))
+            error = e.details["writeErrors"][0]
+            # a concurrent upsert inserted the pair first; resuming there updates that document
+            if error["code"] != 11000 or attempt == 2:
+                raise
+            start += error["index"]
+
+async def apply_swipes(user_oid, swipes: list) -> list:
+    """Record ordered (target_oid, action) swipes and return whether each one is a mutual match.
+
+    One bulk write for the swipes, one `$in` query for reciprocity and one
+    bulk write for mutual_match, however many swipes there are. When a
+    target appears more than once, its last action is the one that sticks.
+    """
+    if dislike_buffer.running:
+        for target_oid, _ in swipes:
+            await dislike_buffer.discard(user_oid, target_oid)
+    inserted = await _write_swipes([(user_oid, target_oid, action) for target_oid, action in swipes])
+    await record_swipes(user_oid, list({swipes[i][0] for i in inserted}))
+    final = {}
+    for target_oid, action in swipes:
+        discovery_queue.invalidate(user_oid, target_oid)
+        final[target_oid] = action
+
+    liked = [t for t, action in final.items() if action == "like"]
+    reciprocal = set()
+    if liked:
+        reciprocal = set(await get_async_db()["match"].distinct(
+            "user_id", {"user_id": {"$in": liked}, "target_id": user_oid, "action": "like"}
+        ))
+    new_targets = {swipes[i][0] for i in inserted}
+    ops = []
+    matches = {}
+    for target_oid, action in final.items():
+        if target_oid in reciprocal:
+            matches[len(ops)] = (user_oid, target_oid, pair_key(user_oid, target_oid))
+            ops.append(UpdateOne(
+                {"_id": pair_key(user_oid, target_oid)},
+                {"$setOnInsert": {"user_ids": sorted([user_oid, target_oid]), "matched_at": datetime.utcnow()}},
+                upsert=True,
+            ))
+        elif action == "dislike" and target_oid not in new_targets:
+            # may be a like flipped to dislike
+            ops.append(DeleteOne({"_id": pair_key(user_oid, target_oid)}))
+    if ops:
+        await write_mutual_matches(ops, matches)
+    return [action == "like" and final[t] == "like" and t in reciprocal for t, action in swipes]
+
+async def write_dislikes(pairs: list):
+    """Flush buffered (user_oid, target_oid) dislikes: one bulk write for all users"""
+    inserted = await _write_swipes([(user_oid, target_oid, "dislike") for user_oid, target_oid in pairs])
+    new_targets = {}
+    for i in inserted:
+        new_targets.setdefault(pairs[i][0], []).append(pairs[i][1])
+    for user_oid, targets in new_targets.items():
+        await record_swipes(user_oid, targets)
+    # may be likes flipped to dislikes
+    ops = [DeleteOne({"_id": pair_key(*pair)}) for i, pair in enumerate(pairs) if i not in inserted]
+    if ops:
+        await get_async_db()["mutual_match"].bulk_write(ops, ordered=False)
 
 @app.post("/profiles/like")
-def like_profile(payload: LikeRequest):
+async def like_profile(payload: LikeRequest):
     user_oid = to_oid(payload.user_id)
     target_oid = to_oid(payload.target_id)
     if user_oid == target_oid:
         raise HTTPException(status_code=400, detail="Cannot like yourself")
-    # record action
-    db["match"].update_one(
-        {"user_id": user_oid, "target_id": target_oid},
-        {"$set": {"action": payload.action, "updated_at": datetime.utcnow()}, "$setOnInsert": {"created_at": datetime.utcnow()}},
-        upsert=True,
-    )
-    matched = False
-    if payload.action == "like":
-        # check reciprocal like
-        other = db["match"].find_one({"user_id": target_oid, "target_id": user_oid, "action": "like"})
-        matched = other is not None
+    if payload.action == "dislike" and dislike_buffer.running:
+        dislike_buffer.add(user_oid, target_oid)
+        discovery_queue.invalidate(user_oid, target_oid)
+        return {"matched": False}
+    matched, = await apply_swipes(user_oid, [(target_oid, payload.action)])
     return {"matched": matched}
 
+@app.post("/profiles/like_batch")
+async def like_profiles(payload: LikeBatchRequest):
+    user_oid = to_oid(payload.user_id)
+    swipes = [(to_oid(s.target_id), s.action) for s in payload.swipes]
+    if any(target_oid == user_oid for target_oid, _ in swipes):
+        raise HTTPException(status_code=400, detail="Cannot like yourself")
+    matched = await apply_swipes(user_oid, swipes)
+    return {"results": [
+        {"target_id": s.target_id, "action": s.action, "matched": m} for s, m in zip(payload.swipes, matched)
+    ]}
+
 # ---------- Chats ----------
 
 @app.get("/chats/list")
-def list_chats(user_id: str):
+async def list_chats(user_id: str, limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None,
+                     include_summary: bool = False):
     user_oid = to_oid(user_id)
-    # find mutual likes
-    my_likes = db["match"].find({"user_id": user_oid, "action": "like"})
-    peers = []
-    for like in my_likes:
-        other_like = db["match"].find_one({"user_id": like["target_id"], "target_id": user_oid, "action": "like"})
-        if other_like:
-            peer_prof = db["profile"].find_one({"user_id": like["target_id"]})
-            if peer_prof:
-                peers.append(serialize(peer_prof))
-    return peers
+    query = {"user_ids": user_oid}
+    if cursor:
+        matched_at, last_id = decode_cursor(cursor, key_type=str)
+        query["$or"] = [
+            {"matched_at": {"$lt": matched_at}},
+            {"matched_at": matched_at, "_id": {"$lt": last_id}},
+        ]
+    mutuals = await (
+        get_async_db()["mutual_match"].find(query).sort([("matched_at", -1), ("_id", -1)]).limit(limit).to_list(None)
+    )
+    peer_ids = [m["user_ids"][1] if m["user_ids"][0] == user_oid else m["user_ids"][0] for m in mutuals]
+    profiles = {p["user_id"]: p async for p in get_async_db()["profile"].find({"user_id": {"$in": peer_ids}})}
+    peers = [serialize(profiles[pid]) for pid in peer_ids if pid in profiles]
+    if include_summary:
+        # last message and unread count come from the per-conversation summary
+        keys = {str(pid): pair_key(user_oid, pid) for pid in peer_ids}
+        convs = {c["_id"]: c async for c in get_async_db()["conversation"].find({"_id": {"$in": list(keys.values())}})}
+        for peer in peers:
+            conv = convs.get(keys[peer["user_id"]], {})
+            peer["last_message"] = serialize(conv.get("last_message"))
+            peer["unread"] = conv.get("unread", {}).get(str(user_oid), 0)
+    next_cursor = None
+    if len(mutuals) == limit:
+        next_cursor = encode_cursor(mutuals[-1]["matched_at"], mutuals[-1]["_id"])
+    return {"peers": peers, "next_cursor": next_cursor}
+
+@app.get("/chats/count")
+async def count_chats(user_id: str):
+    user_oid = to_oid(user_id)
+    return {"matches": await get_async_db()["mutual_match"].count_documents({"user_ids": user_oid})}
 
 @app.get("/chats/messages")
-def get_messages(user_id: str, peer_id: str, limit: int = 50):
+async def get_messages(user_id: str, peer_id: str, limit: int = Query(50, ge=1, le=200),
+                       before: Optional[str] = None, after: Optional[str] = None):
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
     u = to_oid(user_id)
     p = to_oid(peer_id)
-    q = {"$or": [
-        {"sender_id": u, "receiver_id": p},
-        {"sender_id": p, "receiver_id": u},
-    ]}
-    msgs = list(db["message"].find(q).sort("created_at", 1).limit(limit))
-    return [serialize(m) for m in msgs]
+    q = {"conversation_id": pair_key(u, p)}
+    # keyset pages over (created_at, _id), returned newest first
+    if after:
+        created_at, last_id = decode_cursor(after)
+        q = {"$and": [q, {"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "_id": {"$gt": last_id}},
+        ]}]}
+        msgs = await get_async_db()["message"].find(q).sort([("created_at", 1), ("_id", 1)]).limit(limit).to_list(None)
+        msgs.reverse()
+    else:
+        if before:
+            created_at, last_id = decode_cursor(before)
+            q = {"$and": [q, {"$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}},
+            ]}]}
+        msgs = await get_async_db()["message"].find(q).sort([("created_at", -1), ("_id", -1)]).limit(limit).to_list(None)
+    # the reader has now seen the conversation
+    await get_async_db()["conversation"].update_one(
+        {"_id": pair_key(u, p), f"unread.{u}": {"$gt": 0}},
+        {"$set": {f"unread.{u}": 0}},
+    )
+    return {
+        "messages": [serialize(m) for m in msgs],
+        "before": encode_cursor(msgs[-1]["created_at"], msgs[-1]["_id"]) if len(msgs) == limit else None,
+        "after": encode_cursor(msgs[0]["created_at"], msgs[0]["_id"]) if msgs else after,
+    }
 
 @app.post("/chats/send")
-def send_message(payload: SendMessageRequest):
+async def send_message(payload: SendMessageRequest):
     u = to_oid(payload.user_id)
     p = to_oid(payload.peer_id)
+    now = datetime.utcnow()
     doc = {
+        "conversation_id": pair_key(u, p),
         "sender_id": u,
         "receiver_id": p,
         "text": payload.text,
-        "created_at": datetime.utcnow(),
+        # BSON dates keep milliseconds; truncate so the echoed document matches the stored one
+        "created_at": now.replace(microsecond=now.microsecond // 1000 * 1000),
     }
-    mid = db["message"].insert_one(doc).inserted_id
-    saved = db["message"].find_one({"_id": mid})
-    return serialize(saved)
+    # insert_one sets doc["_id"], so the stored document can be echoed back as is
+    await get_async_db()["message"].insert_one(doc)
+    # keep the inbox summary in step: the receiver's unread count always, and the
+    # latest message unless a newer one got there first (concurrent sends land in any order)
+    await get_async_db()["conversation"].bulk_write([
+        UpdateOne(
+            {"_id": doc["conversation_id"]},
+            {"$inc": {f"unread.{p}": 1}, "$setOnInsert": {"user_ids": sorted([u, p])}},
+            upsert=True,
+        ),
+        UpdateOne(
+            {"_id": doc["conversation_id"], "$or": [
+                {"updated_at": {"$exists": False}},
+                {"updated_at": {"$lt": doc["created_at"]}},
+                {"updated_at": doc["created_at"], "last_message._id": {"$lt": doc["_id"]}},
+            ]},
+            {"$set": {"last_message": doc, "updated_at": doc["created_at"]}},
+        ),
+    ], ordered=True)
+    saved = serialize(doc)
+    broker.publish(f"conversation:{doc['conversation_id']}", saved)
+    inbox.publish(str(p), "message", saved)
+    # the sender's other devices
+    inbox.publish(str(u), "message", saved)
+    return saved
+
+
+# /chats/sync streams: response key, collection, timestamp field, _id type
+SYNC_STREAMS = (
+    ("messages", "message", "created_at", ObjectId),
+    ("matches", "mutual_match", "matched_at", str),
+    ("profiles", "profile", "updated_at", ObjectId),
+)
+
+def encode_watermark(ts: datetime, keys: dict) -> str:
+    """/chats/sync watermark: a plain timestamp, plus the last _id per stream cut off at that timestamp"""
+    if not keys:
+        return ts.isoformat()
+    raw = json.dumps({"ts": ts.isoformat(), "keys": keys}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_watermark(token: str):
+    try:
+        ts = datetime.fromisoformat(token)
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        return ts, {}
+    except ValueError:
+        pass
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        keys = {name: key_type(raw["keys"][name]) for name, _, _, key_type in SYNC_STREAMS if name in raw["keys"]}
+        return datetime.fromisoformat(raw["ts"]), keys
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid since timestamp")
+
+def _newer_than(field: str, ts: datetime, key=None) -> dict:
+    if key is None:
+        return {field: {"$gt": ts}}
+    return {"$or": [{field: {"$gt": ts}}, {field: ts, "_id": {"$gt": key}}]}
+
+@app.get("/chats/sync")
+async def sync_changes(user_id: str, since: Optional[str] = None):
+    """Messages, new matches and matched peers' profile changes newer than `since`.
+
+    `since` is the `watermark` of the previous response; treat it as opaque.
+    """
+    user_oid = to_oid(user_id)
+    since_dt, keys = decode_watermark(since) if since else (datetime.min, {})
+    watermark = datetime.utcnow() - timedelta(seconds=SYNC_LAG_SECONDS)
+
+    messages = await get_async_db()["message"].find({"$and": [
+        {"$or": [{"sender_id": user_oid}, {"receiver_id": user_oid}]},
+        _newer_than("created_at", since_dt, keys.get("messages")),
+    ]}).sort([("created_at", 1), ("_id", 1)]).limit(SYNC_LIMIT).to_list(None)
+    matches = await get_async_db()["mutual_match"].find(
+        {"user_ids": user_oid, **_newer_than("matched_at", since_dt, keys.get("matches"))},
+    ).sort([("matched_at", 1), ("_id", 1)]).limit(SYNC_LIMIT).to_list(None)
+    peer_ids = [pid async for m in get_async_db()["mutual_match"].find({"user_ids": user_oid}, {"user_ids": 1})
+                for pid in m["user_ids"] if pid != user_oid]
+    profiles = await get_async_db()["profile"].find(
+        {"user_id": {"$in": peer_ids}, **_newer_than("updated_at", since_dt, keys.get("profiles"))},
+    ).sort([("updated_at", 1), ("_id", 1)]).limit(SYNC_LIMIT).to_list(None)
+
+    # a truncated stream holds the watermark back to its last item; items sharing
+    # that timestamp are told apart by _id, since BSON dates stop at milliseconds
+    results = {"messages": messages, "matches": matches, "profiles": profiles}
+    last = {name: (results[name][-1][field], results[name][-1]["_id"])
+            for name, _, field, _ in SYNC_STREAMS if len(results[name]) == SYNC_LIMIT}
+    next_keys = {}
+    if last:
+        watermark = min(ts for ts, _ in last.values())
+        next_keys = {name: str(key) for name, (ts, key) in last.items() if ts == watermark}
+    elif watermark < since_dt:
+        watermark = since_dt
+    return {
+        "messages": [serialize(m) for m in messages],
+        "matches": [
+            {"peer_id": str(pid), "matched_at": m["matched_at"].isoformat()}
+            for m in matches for pid in m["user_ids"] if pid != user_oid
+        ],
+        "profiles": [serialize(p) for p in profiles],
+        "watermark": encode_watermark(watermark, next_keys),
+        "has_more": bool(last),
+    }
+
+
+async def _pump(websocket: WebSocket, sub):
+    while True:
+        message = await sub.get()
+        if message is OVERFLOW:
+            # client fell behind; it should resume from /chats/messages?after=...
+            await websocket.close(code=1013)
+            return
+        await websocket.send_json(message)
+
+async def _serve_socket(websocket: WebSocket, topic: str):
+    """Accept the socket and push the topic's messages to it until either side goes away"""
+    await websocket.accept()
+    sub = broker.subscribe(topic)
+    pump = asyncio.create_task(_pump(websocket, sub))
+    try:
+        # clients only listen; reading just tells us when they go away
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        pump.cancel()
+        # retrieve the pump's outcome, e.g. a send that failed because the peer vanished
+        with suppress(asyncio.CancelledError, Exception):
+            await pump
+        broker.unsubscribe(sub)
+
+@app.websocket("/ws/chats")
+async def chat_socket(websocket: WebSocket, user_id: str, peer_id: str):
+    if not (ObjectId.is_valid(user_id) and ObjectId.is_valid(peer_id)):
+        await websocket.close(code=1008)
+        return
+    await _serve_socket(websocket, f"conversation:{pair_key(ObjectId(user_id), ObjectId(peer_id))}")
+
+@app.websocket("/ws/events")
+async def event_socket(websocket: WebSocket, user_id: str):
+    if not ObjectId.is_valid(user_id):
+        await websocket.close(code=1008)
+        return
+    await _serve_socket(websocket, f"user:{ObjectId(user_id)}")
+
+# ---------- Notifications ----------
+
+@app.get("/notifications")
+async def list_notifications(user_id: str, limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None):
+    """The user's notifications, newest first"""
+    user_oid = to_oid(user_id)
+    query = {"user_id": user_oid}
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, key_type=str)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+    docs = await (
+        get_async_db()["notification"].find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit).to_list(None)
+    )
+    next_cursor = None
+    if len(docs) == limit:
+        next_cursor = encode_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+    return {"notifications": [serialize(d) for d in docs], "next_cursor": next_cursor}
+
+# ---------- Server-Sent Events ----------
+
+def _sse_frame(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+async def _sse(user_id: str, last_event_id: Optional[str]):
+    # subscribe before reading history so nothing falls in between
+    sub = broker.subscribe(f"user:{user_id}")
+    try:
+        yield "retry: 3000\n\n"
+        last_seq = 0
+        if last_event_id:
+            missed = inbox.since(user_id, last_event_id)
+            if missed is None:
+                # history is gone; the client should catch up with /chats/sync
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                last_seq = inbox.seq(last_event_id)
+                for event in missed:
+                    yield _sse_frame(event)
+                    last_seq = inbox.seq(event["id"])
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.get(), SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is OVERFLOW:
+                # client fell behind; it reconnects and resumes from its Last-Event-ID
+                return
+            if inbox.seq(event["id"]) <= last_seq:
+                continue
+            yield _sse_frame(event)
+    finally:
+        broker.unsubscribe(sub)
+
+@app.get("/events/stream")
+async def event_stream(user_id: str, last_event_id: Optional[str] = Header(None)):
+    """Message, match and profile events for the user as server-sent events.
+
+    Best effort, per worker: events are only pushed by the worker that
+    handled the write, and event ids are only resumable on the worker that
+    issued them (elsewhere the stream starts with a `reset` event). With
+    more than one worker, clients must keep polling /chats/sync as the
+    source of truth and treat this stream as a latency hint.
+    """
+    # publishers key topics and history on the canonical id
+    uid = str(to_oid(user_id))
+    return StreamingResponse(
+        _sse(uid, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 if __name__ == "__main__":
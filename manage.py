@@ -0,0 +1,113 @@
+"""
+Maintenance Commands
+
+Index setup and one-off data migrations for the ROOMANCE backend.
+
+Usage:
+    python manage.py ensure-indexes [--check]
+    python manage.py backfill-mutual-matches
+    python manage.py backfill-conversation-ids
+    python manage.py dedupe-matches
+"""
+
+import argparse
+from datetime import datetime
+
+from database import ensure_indexes as ensure_declared_indexes, get_db, pair_key
+
+
+def ensure_indexes(check_only: bool = False):
+    """Create the indexes declared in schemas.py and print what differs"""
+    report = ensure_declared_indexes(create=not check_only)
+    for collection, entry in report.items():
+        details = ", ".join(f"{k}={v}" for k, v in entry.items() if v)
+        print(f"{collection}: {details or 'ok'}")
+
+
+def backfill_mutual_matches():
+    """Create mutual_match documents for reciprocal likes recorded before the collection existed"""
+    db = get_db()
+    created = 0
+    likes = db["match"].find({"action": "like"}, {"user_id": 1, "target_id": 1, "updated_at": 1})
+    for like in likes:
+        # visit each pair once, from its lower id
+        if not like["user_id"] < like["target_id"]:
+            continue
+        other = db["match"].find_one(
+            {"user_id": like["target_id"], "target_id": like["user_id"], "action": "like"},
+            {"updated_at": 1},
+        )
+        if not other:
+            continue
+        stamps = [t for t in (like.get("updated_at"), other.get("updated_at")) if t]
+        res = db["mutual_match"].update_one(
+            {"_id": pair_key(like["user_id"], like["target_id"])},
+            {"$setOnInsert": {
+                "user_ids": [like["user_id"], like["target_id"]],
+                "matched_at": max(stamps) if stamps else datetime.utcnow(),
+            }},
+            upsert=True,
+        )
+        if res.upserted_id is not None:
+            created += 1
+    print(f"mutual_match: {created} created")
+
+
+def backfill_conversation_ids():
+    """Stamp conversation_id on messages written before it was stored"""
+    db = get_db()
+    pairs = db["message"].aggregate([
+        {"$match": {"conversation_id": {"$exists": False}}},
+        {"$group": {"_id": {"sender_id": "$sender_id", "receiver_id": "$receiver_id"}}},
+    ])
+    updated = 0
+    for pair in pairs:
+        sender, receiver = pair["_id"]["sender_id"], pair["_id"]["receiver_id"]
+        res = db["message"].update_many(
+            {"sender_id": sender, "receiver_id": receiver, "conversation_id": {"$exists": False}},
+            {"$set": {"conversation_id": pair_key(sender, receiver)}},
+        )
+        updated += res.modified_count
+    print(f"message: {updated} updated")
+
+
+def dedupe_matches():
+    """Remove duplicate match documents so the unique (user_id, target_id) index can be built"""
+    db = get_db()
+    groups = db["match"].aggregate([
+        {"$sort": {"updated_at": -1}},
+        {"$group": {"_id": {"user_id": "$user_id", "target_id": "$target_id"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+    removed = 0
+    for group in groups:
+        # keep the most recent decision
+        res = db["match"].delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += res.deleted_count
+    print(f"match: {removed} duplicates removed")
+    info = db["match"].index_information().get("user_id_1_target_id_1")
+    if info and not info.get("unique"):
+        db["match"].drop_index("user_id_1_target_id_1")
+        print("match: dropped non-unique user_id_1_target_id_1")
+    ensure_indexes()
+
+
+COMMANDS = {
+    "ensure-indexes": ensure_indexes,
+    "backfill-mutual-matches": backfill_mutual_matches,
+    "backfill-conversation-ids": backfill_conversation_ids,
+    "dedupe-matches": dedupe_matches,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ROOMANCE maintenance commands")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("--check", action="store_true", help="ensure-indexes: report only, create nothing")
+    args = parser.parse_args()
+    if get_db() is None:
+        raise SystemExit("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if args.command == "ensure-indexes":
+        ensure_indexes(check_only=args.check)
+    else:
+        COMMANDS[args.command]()
@@ -0,0 +1,195 @@
+"""
+Match Events
+
+Outbox for new mutual matches, so both users hear about a match and not
+just the one whose like completed it.
+
+Every mutual_match insert writes a `match_event` document alongside it,
+in the same transaction when the deployment supports transactions
+(replica set or mongos). A consumer task in each worker claims pending
+events in batches under a lease, stores one `notification` per user,
+publishes to the users' inboxes (`user:<id>` broker topics) and marks
+the events delivered. An event whose lease runs out before it is marked
+delivered is claimed again, so delivery is at-least-once: notifications
+are keyed by event and user, and stream clients should dedupe on
+`data.event_id`.
+The broker is in-process, so clients connected to other workers only
+see the match through GET /notifications.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from database import get_async_db
+from realtime import inbox
+
+MATCH_EVENT_BATCH = int(os.getenv("MATCH_EVENT_BATCH", 100))
+MATCH_EVENT_LEASE = float(os.getenv("MATCH_EVENT_LEASE", 30))
+MATCH_EVENT_POLL = float(os.getenv("MATCH_EVENT_POLL", 1.0))
+
+logger = logging.getLogger("uvicorn.error")
+
+# cleared the first time the server rejects a transaction (standalone mongod)
+_transactions = True
+
+
+def _event(user_oid, target_oid, pair: str, now: datetime) -> dict:
+    return {
+        "type": "match",
+        "pair": pair,
+        "user_ids": sorted([user_oid, target_oid]),
+        "created_at": now,
+        "status": "pending",
+        "attempts": 0,
+    }
+
+
+async def _write(ops: list, matches: dict, session=None):
+    res = await get_async_db()["mutual_match"].bulk_write(ops, ordered=False, session=session)
+    now = datetime.utcnow()
+    events = [_event(*matches[i], now) for i in res.upserted_ids if i in matches]
+    if events:
+        await get_async_db()["match_event"].insert_many(events, session=session)
+        consumer.wake()
+    return res
+
+
+async def write_mutual_matches(ops: list, matches: dict):
+    """Apply mutual_match write ops, adding an outbox event for every match they create.
+
+    `matches` maps the index of each upsert in `ops` to its (user_oid, target_oid, pair key).
+    """
+    global _transactions
+    if _transactions:
+        try:
+            async with await get_async_db().client.start_session() as session:
+                return await session.with_transaction(lambda s: _write(ops, matches, s))
+        except OperationFailure as e:
+            # IllegalOperation: transactions need a replica set or mongos
+            if e.code != 20:
+                raise
+            _transactions = False
+    return await _write(ops, matches)
+
+
+class MatchEventConsumer:
+    def __init__(self, batch: int = MATCH_EVENT_BATCH, lease: float = MATCH_EVENT_LEASE,
+                 poll: float = MATCH_EVENT_POLL):
+        self.batch = batch
+        self.lease = lease
+        self.poll = poll
+        self.delivered = 0
+        self.redelivered = 0
+        self.failed_batches = 0
+        self.last_batch_at = None
+        self._wake = None
+        self._task = None
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        """Consume now rather than at the next poll; events written by this worker"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _claim(self) -> list:
+        now = datetime.utcnow()
+        claimable = {"status": "pending", "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]}
+        ids = [e["_id"] async for e in get_async_db()["match_event"].find(claimable, {"_id": 1}).sort("_id", 1).limit(self.batch)]
+        if not ids:
+            return []
+        token = ObjectId()
+        await get_async_db()["match_event"].update_many(
+            {"_id": {"$in": ids}, **claimable},
+            {"$set": {"lease_until": now + timedelta(seconds=self.lease), "lease_owner": token}, "$inc": {"attempts": 1}},
+        )
+        # another worker may have claimed some of them in between
+        return await get_async_db()["match_event"].find({"lease_owner": token}).sort("_id", 1).to_list(None)
+
+    async def consume(self) -> int:
+        """Deliver one batch of pending events; returns how many were claimed"""
+        events = await self._claim()
+        if not events:
+            return 0
+        notifications = []
+        for event in events:
+            for user_oid in event["user_ids"]:
+                peer_oid = event["user_ids"][1] if event["user_ids"][0] == user_oid else event["user_ids"][0]
+                notifications.append({
+                    "_id": f"{event['_id']}:{user_oid}",
+                    "user_id": user_oid,
+                    "type": event["type"],
+                    "peer_id": peer_oid,
+                    "event_id": event["_id"],
+                    "read": False,
+                    "created_at": event["created_at"],
+                })
+        try:
+            await get_async_db()["notification"].bulk_write([InsertOne(n) for n in notifications], ordered=False)
+        except BulkWriteError as e:
+            # notifications left by an earlier, unfinished delivery
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+        for n in notifications:
+            inbox.publish(str(n["user_id"]), n["type"], {
+                "event_id": str(n["event_id"]),
+                "peer_id": str(n["peer_id"]),
+                "created_at": n["created_at"].isoformat(),
+            })
+        await get_async_db()["match_event"].update_many(
+            {"_id": {"$in": [e["_id"] for e in events]}, "lease_owner": events[0]["lease_owner"]},
+            {"$set": {"status": "delivered", "delivered_at": datetime.utcnow()}, "$unset": {"lease_until": "", "lease_owner": ""}},
+        )
+        self.delivered += len(events)
+        self.redelivered += sum(1 for e in events if e["attempts"] > 1)
+        self.last_batch_at = datetime.utcnow()
+        return len(events)
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.consume() == self.batch:
+                    continue
+            except Exception as e:
+                self.failed_batches += 1
+                logger.warning("match event delivery failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def lag(self) -> dict:
+        """Backlog of undelivered events plus this worker's delivery counters"""
+        coll = get_async_db()["match_event"]
+        pending = await coll.count_documents({"status": "pending"})
+        oldest = await coll.find_one({"status": "pending"}, {"created_at": 1}, sort=[("_id", 1)])
+        return {
+            "pending": pending,
+            "oldest_pending_seconds": (datetime.utcnow() - oldest["created_at"]).total_seconds() if oldest else 0,
+            "delivered": self.delivered,
+            "redelivered": self.redelivered,
+            "failed_batches": self.failed_batches,
+            "last_batch_at": self.last_batch_at.isoformat() if self.last_batch_at else None,
+        }
+
+
+consumer = MatchEventConsumer()
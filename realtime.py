@@ -0,0 +1,161 @@
+"""
+Realtime Broker
+
+In-process pub/sub used to push events to connected WebSocket and SSE
+clients.
+
+Each subscriber gets a bounded queue. Publishers never block: a subscriber
+whose queue fills up is marked as overflowed, and its connection is closed
+so the client falls back to paging (/chats/messages?after=...) instead of
+the server buffering without limit. Publishing is thread-safe, so code
+running off the event loop (e.g. in an executor) can publish too.
+
+The Inbox publishes per-user events (`user:<id>` topics) and keeps the
+last few for each user, so a reconnecting /events/stream client can
+resume from its Last-Event-ID.
+
+Both are per process. Under gunicorn each worker only pushes the writes
+it handled itself, so realtime delivery is best effort and /chats/sync
+remains the source of truth.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", 100))
+INBOX_HISTORY_SIZE = int(os.getenv("INBOX_HISTORY_SIZE", 100))
+INBOX_MAX_USERS = int(os.getenv("INBOX_MAX_USERS", 10000))
+
+# Delivered in place of a message once a subscriber has fallen behind
+OVERFLOW = object()
+
+
+class Subscription:
+    def __init__(self, topic: str, maxsize: int):
+        self.topic = topic
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.overflowed = False
+
+    def _offer(self, message):
+        # runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    def __init__(self, queue_size: int = REALTIME_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._topics = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> Subscription:
+        """Register a subscriber; must be called from the event loop"""
+        sub = Subscription(topic, self.queue_size)
+        with self._lock:
+            self._topics[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._topics.get(sub.topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._topics[sub.topic]
+
+    def publish(self, topic: str, message):
+        """Fan a message out to the topic's subscribers without blocking"""
+        with self._lock:
+            subs = list(self._topics.get(topic, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, message)
+            except RuntimeError:
+                # event loop already closed
+                self.unsubscribe(sub)
+
+
+class _History:
+    def __init__(self, size: int):
+        self.events = deque(maxlen=size)
+        # highest seq pushed out of `events`
+        self.evicted = 0
+
+
+class Inbox:
+    """Per-user event log on top of the broker.
+
+    Event ids are "<boot>.<seq>", with seq increasing across all users of
+    this process. An id issued by another process, or older than the
+    history kept for the user, cannot be resumed from.
+    """
+
+    def __init__(self, broker: Broker, history: int = INBOX_HISTORY_SIZE, max_users: int = INBOX_MAX_USERS):
+        self.broker = broker
+        self.history = history
+        self.max_users = max_users
+        self._boot = format(time.time_ns(), "x")
+        self._seq = itertools.count(1)
+        self._users = OrderedDict()
+        # highest seq of any user history dropped to stay under max_users
+        self._forgotten = 0
+        self._lock = threading.Lock()
+
+    def publish(self, user_id: str, type: str, data) -> dict:
+        """Record an event for the user and push it to their subscribers"""
+        with self._lock:
+            seq = next(self._seq)
+            event = {"id": f"{self._boot}.{seq}", "type": type, "data": data}
+            h = self._users.get(user_id)
+            if h is None:
+                h = self._users[user_id] = _History(self.history)
+                while len(self._users) > self.max_users:
+                    _, dropped = self._users.popitem(last=False)
+                    if dropped.events:
+                        self._forgotten = max(self._forgotten, dropped.events[-1][0])
+            else:
+                self._users.move_to_end(user_id)
+            if len(h.events) == h.events.maxlen:
+                h.evicted = h.events[0][0]
+            h.events.append((seq, event))
+        self.broker.publish(f"user:{user_id}", event)
+        return event
+
+    def seq(self, event_id: str):
+        """Sequence number of an id issued by this process, else None"""
+        boot, _, seq = (event_id or "").partition(".")
+        if boot != self._boot or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def since(self, user_id: str, event_id: str):
+        """Events after `event_id`, or None if some of them are no longer kept"""
+        after = self.seq(event_id)
+        if after is None:
+            return None
+        with self._lock:
+            h = self._users.get(user_id)
+            if h is None:
+                return None if after < self._forgotten else []
+            if after < h.evicted:
+                return None
+            return [e for s, e in h.events if s > after]
+
+
+broker = Broker()
+inbox = Inbox(broker)
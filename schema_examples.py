@@ -6,7 +6,7 @@ Copy and modify these examples for your specific needs.
 """
 
 from datetime import datetime
-from database import create_document, get_documents, update_document, delete_document
+from database import create_document, create_documents, get_document, get_documents, update_document, delete_document
 
 # =============================================================================
 # USER MANAGEMENT SCHEMA
@@ -33,8 +33,7 @@ def create_user(name: str, email: str, password_hash: str):
 
 def get_user_by_email(email: str):
     """Get user by email"""
-    users = get_documents("users", {"email": email})
-    return users[0] if users else None
+    return get_document("users", {"email": email})
 
 # =============================================================================
 # BLOG/CMS SCHEMA
@@ -286,6 +285,48 @@ def track_page_view(page_path: str, user_id: str = None, session_id: str = None)
     }
     return create_document("page_views", pageview_data)
 
+def track_user_activities(events: list):
+    """Track many user activity events with one bulk insert per batch
+
+    Each event is a dict with user_id, action, resource_type, resource_id and optional metadata.
+    """
+    now = datetime.utcnow()
+    activities = (
+        {
+            "user_id": e["user_id"],
+            "action": e["action"],
+            "resource_type": e["resource_type"],
+            "resource_id": e["resource_id"],
+            "metadata": e.get("metadata") or {},
+            "ip_address": None,
+            "user_agent": None,
+            "session_id": None,
+            "timestamp": e.get("timestamp", now)
+        }
+        for e in events
+    )
+    return create_documents("user_activities", activities)
+
+def track_page_views(views: list):
+    """Track many page views with one bulk insert per batch
+
+    Each view is a dict with page_path and optional user_id / session_id.
+    """
+    now = datetime.utcnow()
+    pageviews = (
+        {
+            "page_path": v["page_path"],
+            "user_id": v.get("user_id"),
+            "session_id": v.get("session_id"),
+            "referrer": None,
+            "viewport": {"width": None, "height": None},
+            "device_info": {"type": None, "os": None, "browser": None},
+            "timestamp": v.get("timestamp", now)
+        }
+        for v in views
+    )
+    return create_documents("page_views", pageviews)
+
 # =============================================================================
 # NOTIFICATION SCHEMA
 # =============================================================================
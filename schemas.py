@@ -9,10 +9,26 @@ Model name is converted to lowercase for the collection name:
 - User -> "user" collection
 - Product -> "product" collection
 - BlogPost -> "blogs" collection
+A `collection` class variable overrides the derived name.
+
+Indexes are declared next to the schema in an `indexes` class variable;
+database.ensure_indexes() creates them at startup (or via
+`python manage.py ensure-indexes`).
 """
 
-from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from bson import ObjectId
+from pydantic import BaseModel, BeforeValidator, Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from typing import Annotated, ClassVar, List, Optional
+
+# Reference to another document. Stored as a BSON ObjectId, so validation
+# accepts one as well as its 24-digit hex string.
+ObjectIdStr = Annotated[
+    str,
+    BeforeValidator(lambda v: str(v) if isinstance(v, ObjectId) else v),
+    Field(pattern="^[0-9a-fA-F]{24}$"),
+]
 
 # Example schemas (replace with your own):
 
@@ -27,6 +43,10 @@ class User(BaseModel):
     age: Optional[int] = Field(None, ge=0, le=120, description="Age in years")
     is_active: bool = Field(True, description="Whether user is active")
 
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ]
+
 class Product(BaseModel):
     """
     Products collection schema
@@ -41,6 +61,106 @@ class Product(BaseModel):
 # Add your own schemas here:
 # --------------------------------------------------
 
+class Profile(BaseModel):
+    """
+    Dating profiles, one per user
+    Collection name: "profile"
+    """
+    user_id: ObjectIdStr = Field(..., description="ObjectId of the owning user")
+    nickname: str = Field(..., description="Display name")
+    bio: Optional[str] = Field("", description="About me")
+    tags: List[str] = Field(default_factory=list, description="Interest tags")
+    photos: List[str] = Field(default_factory=list, description="Photo URLs")
+    age: Optional[int] = Field(None, ge=0, le=120, description="Age in years")
+
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        # /chats/sync: matched peers' profiles changed since the watermark
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)]),
+        # discovery order and its keyset cursor
+        IndexModel([("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ]
+
+class Match(BaseModel):
+    """
+    Swipe decisions: one document per (user, target)
+    Collection name: "match"
+    """
+    user_id: ObjectIdStr = Field(..., description="ObjectId of the user who swiped")
+    target_id: ObjectIdStr = Field(..., description="ObjectId of the user swiped on")
+    action: str = Field(..., pattern="^(like|dislike)$", description="like or dislike")
+
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_id", ASCENDING), ("target_id", ASCENDING)], unique=True),
+        # reciprocal checks and the discovery anti-join look up by target
+        IndexModel([("target_id", ASCENDING), ("user_id", ASCENDING), ("action", ASCENDING)]),
+    ]
+
+class MutualMatch(BaseModel):
+    """
+    Reciprocal likes, keyed by the ordered user pair
+    Collection name: "mutual_match"
+    """
+    collection: ClassVar[str] = "mutual_match"
+
+    user_ids: List[ObjectIdStr] = Field(..., description="ObjectIds of both users, sorted")
+    matched_at: datetime = Field(..., description="When the second like arrived")
+
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_ids", ASCENDING), ("matched_at", DESCENDING), ("_id", DESCENDING)]),
+    ]
+
+class Message(BaseModel):
+    """
+    Chat messages
+    Collection name: "message"
+    """
+    conversation_id: str = Field(..., description="Ordered pair key of the two users")
+    sender_id: ObjectIdStr = Field(..., description="ObjectId of the sender")
+    receiver_id: ObjectIdStr = Field(..., description="ObjectId of the receiver")
+    text: str = Field(..., description="Message body")
+
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("conversation_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+        # /chats/sync reads across all of a user's conversations
+        IndexModel([("sender_id", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("receiver_id", ASCENDING), ("created_at", ASCENDING)]),
+    ]
+
+class MatchEvent(BaseModel):
+    """
+    Outbox of new mutual matches awaiting delivery
+    Collection name: "match_event"
+    """
+    collection: ClassVar[str] = "match_event"
+
+    type: str = Field("match", description="Event type")
+    pair: str = Field(..., description="Ordered pair key of the two users")
+    user_ids: List[ObjectIdStr] = Field(..., description="ObjectIds of both users, sorted")
+    status: str = Field("pending", pattern="^(pending|delivered)$", description="Delivery state")
+    attempts: int = Field(0, ge=0, description="Times the event has been claimed")
+
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("lease_owner", ASCENDING)], sparse=True),
+        # delivered events are kept a week for inspection
+        IndexModel([("delivered_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ]
+
+class Notification(BaseModel):
+    """
+    Per-user notifications
+    Collection name: "notification"
+    """
+    user_id: ObjectIdStr = Field(..., description="ObjectId of the recipient")
+    type: str = Field(..., description="Notification type, e.g. match")
+    peer_id: Optional[ObjectIdStr] = Field(None, description="ObjectId of the other user involved")
+    read: bool = Field(False, description="Whether the user has seen it")
+
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ]
+
 # Note: The Flames database viewer will automatically:
 # 1. Read these schemas from GET /schema endpoint
 # 2. Use them for document validation when creating/editing
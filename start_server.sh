@@ -1,10 +1,13 @@
 #!/bin/bash
-echo "Starting FastAPI backend server..."
+# Usage: ./start_server.sh [dev|prod]   (or SERVER_MODE=prod)
+MODE="${1:-${SERVER_MODE:-dev}}"
+PORT="${PORT:-8000}"
+echo "Starting FastAPI backend server ($MODE)..."
 
 # Find and kill MainThread processes
-PIDS=$(ps | grep uvicorn | grep -v grep | awk '{print $1}')
+PIDS=$(ps | grep -E "uvicorn|gunicorn" | grep -v grep | awk '{print $1}')
 if [ ! -z "$PIDS" ]; then
-  echo "Killing uvicorn processes: $PIDS"
+  echo "Killing server processes: $PIDS"
   for pid in $PIDS; do
     kill $pid 2>/dev/null || true
   done
@@ -15,5 +18,21 @@ mkdir -p logs
 echo "Installing dependencies..."
 pip install -r requirements.txt
 echo "Starting FastAPI server..."
-nohup uvicorn main:app --host 0.0.0.0 --port 8000 --reload > logs/server.log 2>&1 
+if [ "$MODE" = "prod" ]; then
+  # one worker per CPU, recycled after MAX_REQUESTS; SIGTERM drains in-flight requests.
+  # Realtime pushes (/ws/*, /events/stream) only reach clients connected to the
+  # worker that handled the write; clients must keep polling /chats/sync.
+  nohup gunicorn main:app -c gunicorn.conf.py > logs/server.log 2>&1 &
+  echo "Waiting for workers to report the database ready..."
+  for i in $(seq 1 60); do
+    if curl -fs "http://127.0.0.1:$PORT/health/ready" > /dev/null; then
+      echo "Server ready"
+      exit 0
+    fi
+    sleep 1
+  done
+  echo "Server started but not ready; see logs/server.log"
+  exit 1
+fi
+nohup uvicorn main:app --host 0.0.0.0 --port $PORT --reload > logs/server.log 2>&1 
 echo "Server started in background"
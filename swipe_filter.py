@@ -0,0 +1,116 @@
+"""
+Swipe Filter
+
+Persisted Bloom filter of the targets each user has liked or disliked.
+
+One `swipe_filter` document per user (`_id` is the user's ObjectId) holds
+the set bits as a sparse map of 64-bit words ({"<word index>": Int64}), so
+light swipers cost a few bytes and updates are a single atomic `$bit`
+upsert. A hit is only "maybe
+swiped" and must be confirmed against `match`; a miss is exact.
+"""
+
+import hashlib
+import math
+import os
+from datetime import datetime
+
+from bson.int64 import Int64
+
+from database import get_async_db
+
+SWIPE_FILTER_CAPACITY = int(os.getenv("SWIPE_FILTER_CAPACITY", 10000))
+SWIPE_FILTER_ERROR_RATE = float(os.getenv("SWIPE_FILTER_ERROR_RATE", 0.01))
+
+_BITS = max(64, int(-SWIPE_FILTER_CAPACITY * math.log(SWIPE_FILTER_ERROR_RATE) / math.log(2) ** 2))
+_HASHES = max(1, round(_BITS / SWIPE_FILTER_CAPACITY * math.log(2)))
+
+
+def _signed(word: int) -> Int64:
+    # BSON longs are signed; bit 63 maps to the negative range
+    return Int64(word - (1 << 64) if word >= 1 << 63 else word)
+
+
+class SwipeFilter:
+    def __init__(self, words: dict = None, bits: int = _BITS, hashes: int = _HASHES, count: int = 0):
+        self.words = {int(k): v for k, v in (words or {}).items()}
+        self.bits = bits
+        self.hashes = hashes
+        self.count = count
+
+    @classmethod
+    def from_doc(cls, doc: dict):
+        return cls(doc.get("words"), doc["bits"], doc["hashes"], doc.get("count", 0))
+
+    def positions(self, oid):
+        digest = hashlib.blake2b(oid.binary, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def masks(self, oid) -> dict:
+        """Word index -> OR mask for the bits of `oid`"""
+        masks = {}
+        for pos in self.positions(oid):
+            masks[pos // 64] = masks.get(pos // 64, 0) | (1 << (pos % 64))
+        return masks
+
+    def add(self, oid):
+        for w, mask in self.masks(oid).items():
+            self.words[w] = self.words.get(w, 0) | mask
+
+    def __contains__(self, oid) -> bool:
+        return all((self.words.get(pos // 64, 0) >> (pos % 64)) & 1 for pos in self.positions(oid))
+
+    @property
+    def saturated(self) -> bool:
+        return self.count > SWIPE_FILTER_CAPACITY
+
+
+def _bit_update(masks: dict) -> dict:
+    return {f"words.{w}": {"or": _signed(mask)} for w, mask in masks.items()}
+
+
+async def record_swipes(user_oid, target_oids: list):
+    """Add newly swiped targets to the user's filter in a single update"""
+    if not target_oids:
+        return
+    sf = SwipeFilter()
+    for target_oid in target_oids:
+        sf.add(target_oid)
+    await get_async_db()["swipe_filter"].update_one(
+        {"_id": user_oid},
+        {
+            "$bit": _bit_update(sf.words),
+            "$inc": {"count": len(target_oids)},
+            "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": {"bits": _BITS, "hashes": _HASHES},
+        },
+        upsert=True,
+    )
+
+
+async def load_swipe_filter(user_oid) -> SwipeFilter:
+    """Load the user's filter, building it from `match` if it has never been completed"""
+    doc = await get_async_db()["swipe_filter"].find_one({"_id": user_oid})
+    if doc and (doc["bits"], doc["hashes"]) != (_BITS, _HASHES):
+        # sized with different settings; bit positions no longer line up
+        await get_async_db()["swipe_filter"].delete_one({"_id": user_oid})
+        doc = None
+    if doc and doc.get("complete"):
+        return SwipeFilter.from_doc(doc)
+
+    sf = SwipeFilter.from_doc(doc) if doc else SwipeFilter()
+    targets = await get_async_db()["match"].distinct("target_id", {"user_id": user_oid})
+    for target in targets:
+        sf.add(target)
+    sf.count = len(targets)
+    update = {
+        "$set": {"complete": True, "count": sf.count, "updated_at": datetime.utcnow()},
+        "$setOnInsert": {"bits": sf.bits, "hashes": sf.hashes},
+    }
+    if sf.words:
+        # OR rather than overwrite, so bits set by concurrent swipes are kept
+        update["$bit"] = _bit_update(sf.words)
+    await get_async_db()["swipe_filter"].update_one({"_id": user_oid}, update, upsert=True)
+    return sf
@@ -0,0 +1,116 @@
+"""
+Test fixtures
+
+The app runs against an in-memory mongomock store, installed as the
+process's clients in database.py so every get_db()/get_async_db() caller
+sees it. Calls that reach the server are recorded per test, to pin down
+how many round trips an endpoint makes.
+"""
+
+import dataclasses
+import os
+import sys
+
+import mongomock
+import pytest
+from bson.int64 import Int64
+from mongomock.store import ServerStore
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import match_events  # noqa: E402
+
+# Collection methods that each cost one round trip
+COMMANDS = {
+    "aggregate", "bulk_write", "count_documents", "delete_many", "delete_one", "distinct", "find",
+    "find_one", "find_one_and_delete", "find_one_and_replace", "find_one_and_update", "insert_many",
+    "insert_one", "replace_one", "update_many", "update_one",
+}
+
+
+class _Collection:
+    def __init__(self, collection, log: list):
+        self._collection = collection
+        self._log = log
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in COMMANDS:
+            return attr
+
+        def call(*args, **kwargs):
+            self._log.append((self._collection.name, name))
+            return attr(*args, **kwargs)
+        return call
+
+
+class _Database:
+    def __init__(self, db, log: list):
+        self._db = db
+        self._log = log
+
+    def __getitem__(self, name):
+        return _Collection(self._db[name], self._log)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class _Client:
+    def __init__(self, client, log: list):
+        self._client = client
+        self._log = log
+
+    def __getitem__(self, name):
+        return _Database(self._client[name], self._log)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _update_one_with_bit(update_one):
+    # mongomock has no $bit; swipe_filter only uses {"or": mask}
+    def wrapper(self, filter, update, upsert=False, **kwargs):
+        if "$bit" in update:
+            update = dict(update)
+            sets = dict(update.get("$set", {}))
+            doc = self.find_one(filter) or {}
+            for path, op in update.pop("$bit").items():
+                current = doc
+                for part in path.split("."):
+                    current = current.get(part, 0) if isinstance(current, dict) else 0
+                sets[path] = Int64(int(current or 0) | int(op["or"]))
+            update["$set"] = sets
+        return update_one(self, filter, update, upsert=upsert, **kwargs)
+    return wrapper
+
+
+@pytest.fixture
+def commands():
+    """(collection, method) of every server call made through get_async_db()"""
+    return []
+
+
+@pytest.fixture
+def mongo(monkeypatch, commands):
+    """Fresh in-memory database behind database.get_db() and database.get_async_db()"""
+    monkeypatch.setattr(mongomock.collection.Collection, "update_one",
+                        _update_one_with_bit(mongomock.collection.Collection.update_one))
+    store = ServerStore()
+    monkeypatch.setattr(database, "settings", dataclasses.replace(database.settings, url="mongodb://test", name="test"))
+    monkeypatch.setattr(database, "_pid", os.getpid())
+    monkeypatch.setattr(database, "_client", mongomock.MongoClient(_store=store))
+    monkeypatch.setattr(database, "_async_client", _Client(AsyncMongoMockClient(_store=store), commands))
+    # mongomock has no sessions, so no transactions either
+    monkeypatch.setattr(match_events, "_transactions", False)
+    return database.get_db()
+
+
+@pytest.fixture
+def client(mongo):
+    """TestClient without lifespan, so no background consumers run during a test"""
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
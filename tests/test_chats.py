@@ -0,0 +1,40 @@
+"""Chat list and conversations"""
+
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import main
+from database import pair_key
+
+
+def test_unread_count_ignores_id_spelling(client, mongo):
+    me, peer = ObjectId(), ObjectId()
+    mongo["profile"].insert_one({"user_id": peer, "nickname": "peer"})
+    mongo["mutual_match"].insert_one({"_id": pair_key(me, peer), "user_ids": sorted([me, peer]), "matched_at": datetime.utcnow()})
+    for _ in range(2):
+        client.post("/chats/send", json={"user_id": str(peer), "peer_id": str(me), "text": "hi"})
+
+    for spelling in (str(me), str(me).upper()):
+        res = client.get("/chats/list", params={"user_id": spelling, "include_summary": True}).json()
+        assert [p["unread"] for p in res["peers"]] == [2]
+
+
+def test_older_message_does_not_replace_last_message(client, mongo, monkeypatch):
+    me, peer = ObjectId(), ObjectId()
+    sent_at = datetime.utcnow().replace(microsecond=0)
+
+    class Clock(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now
+
+    monkeypatch.setattr(main, "datetime", Clock)
+    # the later message's summary update lands first
+    for now, text in ((sent_at, "second"), (sent_at - timedelta(seconds=1), "first")):
+        client.post("/chats/send", json={"user_id": str(me), "peer_id": str(peer), "text": text})
+
+    conversation = mongo["conversation"].find_one({"_id": pair_key(me, peer)})
+    assert conversation["last_message"]["text"] == "second"
+    assert conversation["updated_at"] == sent_at
+    assert conversation["unread"] == {str(peer): 2}
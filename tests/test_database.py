@@ -0,0 +1,32 @@
+"""Helpers in database.py"""
+
+import pytest
+
+from database import bulk_delete_documents, get_documents
+
+
+def test_get_documents_pages_by_id(mongo):
+    mongo["item"].insert_many([{"name": f"n{i:02}", "even": i % 2 == 0} for i in range(25)])
+
+    seen, after = [], None
+    while True:
+        page = get_documents("item", {"even": True}, limit=4, after=after)
+        if not page:
+            break
+        seen += page
+        after = page[-1]["_id"]
+    assert [d["name"] for d in seen] == [f"n{i:02}" for i in range(0, 25, 2)]
+
+
+def test_get_documents_rejects_after_with_sort(mongo):
+    with pytest.raises(ValueError):
+        get_documents("item", sort=[("name", -1)], after=mongo["item"].insert_one({}).inserted_id)
+
+
+def test_bulk_delete_documents_deletes_one_per_filter(mongo):
+    mongo["item"].insert_many([{"kind": k} for k in "aaabb"])
+
+    assert bulk_delete_documents("item", [{"kind": "a"}, {"kind": "b"}])["deleted"] == 2
+    assert sorted(d["kind"] for d in mongo["item"].find()) == ["a", "a", "b"]
+    assert bulk_delete_documents("item", [{"kind": "a"}], many=True)["deleted"] == 2
+    assert [d["kind"] for d in mongo["item"].find()] == ["b"]
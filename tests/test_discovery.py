@@ -0,0 +1,30 @@
+"""GET /profiles/next against the per-worker discovery queue"""
+
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def _profile(mongo, nickname: str):
+    user_oid = ObjectId()
+    mongo["profile"].insert_one({"user_id": user_oid, "nickname": nickname, "updated_at": datetime.utcnow()})
+    return user_oid
+
+
+def test_empty_queue_picks_up_new_profiles(client, mongo):
+    me = ObjectId()
+    assert client.get("/profiles/next", params={"user_id": str(me)}).json() == {"message": "No more profiles"}
+
+    other = _profile(mongo, "new")
+    assert client.get("/profiles/next", params={"user_id": str(me)}).json()["user_id"] == str(other)
+
+
+def test_swipe_from_another_worker_is_skipped(client, mongo):
+    me = ObjectId()
+    first, second = _profile(mongo, "first"), _profile(mongo, "second")
+    head = client.get("/profiles/next", params={"user_id": str(me)}).json()["user_id"]
+    assert head == str(second)
+
+    # recorded by another worker: this worker's queue is never invalidated
+    mongo["match"].insert_one({"user_id": me, "target_id": second, "action": "dislike"})
+    assert client.get("/profiles/next", params={"user_id": str(me)}).json()["user_id"] == str(first)
@@ -0,0 +1,151 @@
+"""Buffered dislikes (DISLIKE_BUFFER=1)"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import discovery
+import main
+from dislike_buffer import DislikeBuffer
+
+
+@pytest.fixture
+def buffer(mongo, monkeypatch):
+    # flushed only when a test asks for it
+    buf = DislikeBuffer(size=1000, interval=3600)
+    monkeypatch.setattr(main, "dislike_buffer", buf)
+    monkeypatch.setattr(discovery, "dislike_buffer", buf)
+    return buf
+
+
+def _swipe(user_oid, target_oid, action):
+    return main.like_profile(main.LikeRequest(user_id=str(user_oid), target_id=str(target_oid), action=action))
+
+
+def _actions(mongo, user_oid):
+    return {d["target_id"]: d["action"] for d in mongo["match"].find({"user_id": user_oid})}
+
+
+def test_pending_targets_are_excluded_from_candidates(buffer):
+    me, pending, inflight = ObjectId(), ObjectId(), ObjectId()
+    assert discovery._candidate_query(me) == {"user_id": {"$ne": me}}
+
+    buffer.add(me, pending)
+    buffer._inflight = {me: {inflight}}
+    query = discovery._candidate_query(me)
+    assert set(query["user_id"]["$nin"]) == {pending, inflight}
+    assert "$nin" not in discovery._candidate_query(ObjectId())["user_id"]
+
+
+def test_like_supersedes_pending_dislike(buffer, mongo):
+    me, target = ObjectId(), ObjectId()
+
+    async def run():
+        buffer.start(main.write_dislikes)
+        await _swipe(me, target, "dislike")
+        assert buffer.pending(me) == {target}
+        await _swipe(me, target, "like")
+        assert buffer.pending(me) == set()
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert _actions(mongo, me) == {target: "like"}
+
+
+def test_like_waits_for_inflight_dislike(buffer, mongo):
+    me, target = ObjectId(), ObjectId()
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow_write(pairs):
+            await release.wait()
+            await main.write_dislikes(pairs)
+
+        buffer.start(slow_write)
+        await _swipe(me, target, "dislike")
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        assert buffer.pending(me) == {target}
+
+        like = asyncio.create_task(_swipe(me, target, "like"))
+        await asyncio.sleep(0.01)
+        # the like must not be written before the dislike it overrides
+        assert not like.done()
+        release.set()
+        await flush
+        assert (await like)["matched"] is False
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert _actions(mongo, me) == {target: "like"}
+
+
+def test_failed_flush_is_requeued(buffer, mongo):
+    me, kept, liked = ObjectId(), ObjectId(), ObjectId()
+
+    async def run():
+        release = asyncio.Event()
+
+        async def failing_write(pairs):
+            await release.wait()
+            raise RuntimeError("write failed")
+
+        buffer.start(failing_write)
+        buffer.add(me, kept)
+        buffer.add(me, liked)
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        # superseded while in flight: not requeued when the flush fails
+        discard = asyncio.create_task(buffer.discard(me, liked))
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(RuntimeError):
+            await flush
+        await discard
+        assert buffer.pending(me) == {kept}
+
+        buffer._write = main.write_dislikes
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert _actions(mongo, me) == {kept: "dislike"}
+
+
+def test_stop_flushes_pending(buffer, mongo):
+    me, targets = ObjectId(), [ObjectId() for _ in range(3)]
+
+    async def run():
+        buffer.start(main.write_dislikes)
+        for t in targets:
+            await _swipe(me, t, "dislike")
+        assert mongo["match"].count_documents({}) == 0
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert _actions(mongo, me) == {t: "dislike" for t in targets}
+    assert not buffer.running
+
+
+def test_buffered_dislike_then_like(buffer, mongo):
+    me = ObjectId()
+    first, second = (ObjectId() for _ in range(2))
+    mongo["profile"].insert_many([
+        {"user_id": p, "nickname": p.binary.hex(), "updated_at": datetime.utcnow()} for p in (first, second)
+    ])
+
+    async def run():
+        buffer.start(main.write_dislikes)
+        await _swipe(me, first, "dislike")
+        page = await main.next_profile_batch(str(me), k=10, cursor=None)
+        assert [p["user_id"] for p in page["profiles"]] == [str(second)]
+
+        await buffer.flush()
+        assert _actions(mongo, me) == {first: "dislike"}
+        await _swipe(me, first, "like")
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert _actions(mongo, me) == {first: "like"}
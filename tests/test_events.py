@@ -0,0 +1,38 @@
+"""GET /events/stream"""
+
+import asyncio
+import time
+
+from bson import ObjectId
+
+import main
+from realtime import broker, inbox
+
+
+async def _frames(user_id: str, count: int, publish):
+    res = await main.event_stream(user_id, None)
+    stream = res.body_iterator
+    frames = [await stream.__anext__()]
+    publish()
+    while len(frames) < count:
+        frames.append(await stream.__anext__())
+    await stream.aclose()
+    return frames
+
+
+def test_stream_normalises_the_user_id(mongo):
+    me = ObjectId()
+    frames = asyncio.run(_frames(str(me).upper(), 2, lambda: inbox.publish(str(me), "message", {"text": "hi"})))
+    assert frames[1].startswith("id: ") and '"text": "hi"' in frames[1]
+
+
+def test_event_socket_normalises_the_user_id(client):
+    me = ObjectId()
+    with client.websocket_connect(f"/ws/events?user_id={str(me).upper()}") as ws:
+        # the handler subscribes just after accepting
+        for _ in range(100):
+            if f"user:{me}" in broker._topics:
+                break
+            time.sleep(0.01)
+        inbox.publish(str(me), "message", {"text": "hi"})
+        assert ws.receive_json()["data"] == {"text": "hi"}
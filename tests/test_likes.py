@@ -0,0 +1,68 @@
+"""Swipe recording under concurrency"""
+
+import asyncio
+
+import mongomock
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+import database
+import main
+
+
+@pytest.fixture
+def indexed(mongo):
+    for collection, models in database._index_models().items():
+        mongo[collection].create_indexes(models)
+    return mongo
+
+
+def test_parallel_likes_on_one_pair(indexed):
+    a, b = ObjectId(), ObjectId()
+
+    async def run():
+        likes = [
+            main.like_profile(main.LikeRequest(user_id=str(u), target_id=str(t), action="like"))
+            for _ in range(1000) for u, t in ((a, b), (b, a))
+        ]
+        return await asyncio.gather(*likes)
+
+    results = asyncio.run(run())
+    assert any(r["matched"] for r in results)
+    assert indexed["match"].count_documents({}) == 2
+    assert indexed["mutual_match"].count_documents({}) == 1
+    assert indexed["match_event"].count_documents({}) == 1
+    # the swipe filter counts each target once
+    assert [indexed["swipe_filter"].find_one({"_id": u})["count"] for u in (a, b)] == [1, 1]
+
+
+def test_lost_upsert_race_is_retried(indexed, monkeypatch):
+    a, b, x, y = (ObjectId() for _ in range(4))
+    indexed["match"].insert_one({"user_id": b, "target_id": a, "action": "like"})
+    bulk_write = mongomock.collection.Collection.bulk_write
+    raced = []
+
+    def losing_bulk_write(self, requests, ordered=True, **kwargs):
+        if self.name == "match" and not raced:
+            # another request inserts (a, b) between our first write and our upsert of it
+            raced.append(True)
+            result = bulk_write(self, requests[:1], ordered=ordered, **kwargs)
+            self.insert_one({"user_id": a, "target_id": b, "action": "like"})
+            raise BulkWriteError({
+                "writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key error"}],
+                "upserted": [{"index": i, "_id": _id} for i, _id in result.upserted_ids.items()],
+            })
+        return bulk_write(self, requests, ordered=ordered, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", losing_bulk_write)
+    matched = asyncio.run(main.apply_swipes(a, [(x, "like"), (b, "like"), (y, "dislike")]))
+
+    assert raced
+    assert matched == [False, True, False]
+    assert {d["target_id"]: d["action"] for d in indexed["match"].find({"user_id": a})} == {
+        x: "like", b: "like", y: "dislike",
+    }
+    assert indexed["mutual_match"].count_documents({}) == 1
+    # (a, b) was inserted by the other request, which records it in the filter itself
+    assert indexed["swipe_filter"].find_one({"_id": a})["count"] == 2
@@ -0,0 +1,80 @@
+"""Match event outbox delivery and the notification read path"""
+
+import asyncio
+import dataclasses
+import os
+import time
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+import main
+from match_events import consumer
+
+
+def _match(client, a, b):
+    for u, t in ((a, b), (b, a)):
+        client.post("/profiles/like", json={"user_id": str(u), "target_id": str(t), "action": "like"})
+
+
+def test_match_notifies_both_users(client, mongo):
+    a, b = ObjectId(), ObjectId()
+    _match(client, a, b)
+    assert asyncio.run(consumer.consume()) == 1
+    assert mongo["match_event"].find_one()["status"] == "delivered"
+
+    for user, peer in ((a, b), (b, a)):
+        notifications = client.get("/notifications", params={"user_id": str(user)}).json()["notifications"]
+        assert [(n["type"], n["peer_id"]) for n in notifications] == [("match", str(peer))]
+
+
+def test_notifications_page_newest_first(client, mongo):
+    me = ObjectId()
+    for _ in range(5):
+        _match(client, me, ObjectId())
+    asyncio.run(consumer.consume())
+
+    seen, cursor = [], None
+    while True:
+        params = {"user_id": str(me), "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/notifications", params=params).json()
+        seen += page["notifications"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len({n["id"] for n in seen}) == 5
+    assert [n["created_at"] for n in seen] == sorted((n["created_at"] for n in seen), reverse=True)
+
+
+def test_consumer_not_started_without_database(monkeypatch):
+    monkeypatch.setattr(database, "settings", dataclasses.replace(database.settings, url=None, name=None))
+    with TestClient(main.app):
+        assert consumer._task is None
+
+
+def test_startup_creates_the_client_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(database, "settings", dataclasses.replace(database.settings, url="mongodb://test", name="test"))
+    monkeypatch.setattr(database, "_pid", os.getpid())
+    monkeypatch.setattr(database, "_async_client", None)
+    monkeypatch.setattr(main, "ENSURE_INDEXES_ON_STARTUP", False)
+    on_loop = []
+
+    def client(*args, **kwargs):
+        # pymongo resolves mongodb+srv:// hosts while constructing the client
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return AsyncMongoMockClient()
+
+    monkeypatch.setattr(database, "AsyncIOMotorClient", client)
+    with TestClient(main.app) as c:
+        for _ in range(100):
+            if c.get("/health/ready").status_code == 200:
+                break
+            time.sleep(0.05)
+        assert consumer._task is not None
+    assert on_loop == [False]
@@ -0,0 +1,105 @@
+"""Database round trips per request; these should not grow with the user's data"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from database import pair_key
+
+
+def _seed_matches(mongo, user_oid, likes: int, mutual: int):
+    now = datetime.utcnow()
+    peers = [ObjectId() for _ in range(likes)]
+    mongo["profile"].insert_many([{"user_id": p, "nickname": f"p{i}", "updated_at": now} for i, p in enumerate(peers)])
+    mongo["match"].insert_many([{"user_id": user_oid, "target_id": p, "action": "like"} for p in peers])
+    mongo["match"].insert_many([{"user_id": p, "target_id": user_oid, "action": "like"} for p in peers[:mutual]])
+    mongo["mutual_match"].insert_many([
+        {"_id": pair_key(user_oid, p), "user_ids": sorted([user_oid, p]), "matched_at": now - timedelta(seconds=i)}
+        for i, p in enumerate(peers[:mutual])
+    ])
+    return peers
+
+
+@pytest.mark.parametrize("likes", [1, 50, 500])
+def test_chats_list(client, mongo, commands, likes):
+    user_oid = ObjectId()
+    _seed_matches(mongo, user_oid, likes, mutual=max(1, likes // 5))
+
+    res = client.get("/chats/list", params={"user_id": str(user_oid)})
+    assert res.status_code == 200
+    assert len(res.json()["peers"]) == min(max(1, likes // 5), 50)
+    assert commands == [("mutual_match", "find"), ("profile", "find")]
+
+
+@pytest.mark.parametrize("likes", [1, 500])
+def test_chats_list_with_summary(client, mongo, commands, likes):
+    user_oid = ObjectId()
+    _seed_matches(mongo, user_oid, likes, mutual=max(1, likes // 5))
+
+    res = client.get("/chats/list", params={"user_id": str(user_oid), "include_summary": True})
+    assert res.status_code == 200
+    assert commands == [("mutual_match", "find"), ("profile", "find"), ("conversation", "find")]
+
+
+def test_chats_send(client, commands):
+    res = client.post("/chats/send", json={"user_id": str(ObjectId()), "peer_id": str(ObjectId()), "text": "hi"})
+    assert res.status_code == 200
+    assert commands == [("message", "insert_one"), ("conversation", "bulk_write")]
+
+
+# the trailing mutual_match read is the background task pushing the profile to matches
+PROFILE_WRITE = [("profile", "find_one_and_update"), ("mutual_match", "find")]
+
+
+def test_profile_details(client, commands):
+    res = client.post("/profile/details", json={"user_id": str(ObjectId()), "nickname": "a"})
+    assert res.status_code == 200
+    assert commands == PROFILE_WRITE
+
+
+def test_profile_update(client, mongo, commands):
+    user_oid = ObjectId()
+    mongo["profile"].insert_one({"user_id": user_oid, "nickname": "a"})
+
+    res = client.post("/profile/update", json={"user_id": str(user_oid), "bio": "new"})
+    assert res.status_code == 200
+    assert res.json()["bio"] == "new"
+    assert commands == PROFILE_WRITE
+
+
+def _seed_discovery(mongo, user_oid, swiped: int, unseen: int = 30):
+    now = datetime.utcnow()
+    mongo["match"].insert_many([{"user_id": user_oid, "target_id": ObjectId(), "action": "dislike"} for _ in range(swiped)])
+    fresh = [ObjectId() for _ in range(unseen)]
+    mongo["profile"].insert_many([
+        {"user_id": p, "nickname": f"p{i}", "updated_at": now - timedelta(seconds=i)} for i, p in enumerate(fresh)
+    ])
+    return fresh
+
+
+# under the swipe filter's capacity, past which discovery switches to a $lookup anti-join
+@pytest.mark.parametrize("swiped", [1, 9000])
+def test_profiles_next_is_flat_in_swipe_history(client, mongo, commands, swiped):
+    user_oid = ObjectId()
+    fresh = _seed_discovery(mongo, user_oid, swiped)
+    # the first call builds the queue; only the steady state is pinned
+    client.get("/profiles/next", params={"user_id": str(user_oid)})
+    commands.clear()
+
+    res = client.get("/profiles/next", params={"user_id": str(user_oid)})
+    assert res.json()["user_id"] == str(fresh[0])
+    assert commands == [("match", "find_one"), ("profile", "find_one")]
+
+
+def test_profiles_next_confirms_the_head(client, mongo, commands):
+    user_oid = ObjectId()
+    fresh = _seed_discovery(mongo, user_oid, 1)
+    client.get("/profiles/next", params={"user_id": str(user_oid)})
+    # swiped through another worker, which cannot invalidate this worker's queue
+    mongo["match"].insert_one({"user_id": user_oid, "target_id": fresh[0], "action": "like"})
+    commands.clear()
+
+    res = client.get("/profiles/next", params={"user_id": str(user_oid)})
+    assert res.json()["user_id"] == str(fresh[1])
+    assert commands == [("match", "find_one"), ("match", "find_one"), ("profile", "find_one")]
@@ -0,0 +1,48 @@
+"""GET /chats/sync watermarks"""
+
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import main
+from database import pair_key
+
+
+def _sync_all(client, user_oid, since=None):
+    batches = []
+    while True:
+        params = {"user_id": str(user_oid), **({"since": since} if since else {})}
+        res = client.get("/chats/sync", params=params).json()
+        batches.append(res)
+        since = res["watermark"]
+        if not res["has_more"]:
+            return batches, since
+
+
+def test_truncated_stream_keeps_items_sharing_a_timestamp(client, mongo, monkeypatch):
+    monkeypatch.setattr(main, "SYNC_LIMIT", 10)
+    me = ObjectId()
+    # one like_batch stamps every match it creates with the same millisecond
+    matched_at = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=1)
+    peers = [ObjectId() for _ in range(25)]
+    mongo["mutual_match"].insert_many([
+        {"_id": pair_key(me, p), "user_ids": sorted([me, p]), "matched_at": matched_at} for p in peers
+    ])
+
+    batches, _ = _sync_all(client, me)
+    received = [m["peer_id"] for b in batches for m in b["matches"]]
+    assert sorted(received) == sorted(str(p) for p in peers)
+    assert len(batches) == 3
+
+
+def test_plain_timestamp_watermark_still_accepted(client, mongo):
+    me, peer = ObjectId(), ObjectId()
+    since = (datetime.utcnow() - timedelta(minutes=5)).isoformat()
+    mongo["mutual_match"].insert_one({
+        "_id": pair_key(me, peer), "user_ids": sorted([me, peer]), "matched_at": datetime.utcnow() - timedelta(minutes=1),
+    })
+
+    batches, watermark = _sync_all(client, me, since)
+    assert [m["peer_id"] for m in batches[0]["matches"]] == [str(peer)]
+    assert datetime.fromisoformat(watermark)
+    assert client.get("/chats/sync", params={"user_id": str(me), "since": "garbage"}).status_code == 400